@@ -0,0 +1,199 @@
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+import faiss
+
+# ---------------- Semantic Answer Cache ----------------
+# Replies are cached against the embedding of the question that produced
+# them. A new question whose embedding is close enough to a cached one
+# (cosine similarity >= threshold) gets the stored reply without an LLM call.
+#
+# Entries live in a SQLite database so every worker (and restarts) share
+# them. Each process keeps its own small FAISS index over the cached
+# embeddings and tops it up from the database; a hit is always confirmed
+# against the database, so entries evicted by another worker are never served.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.environ.get("BB_ANSWER_CACHE_PATH", os.path.join(BASE_DIR, "answer_cache.sqlite3"))
+CACHE_ENABLED = os.environ.get("BB_ANSWER_CACHE", "1") != "0"
+SIMILARITY_THRESHOLD = float(os.environ.get("BB_ANSWER_CACHE_THRESHOLD", "0.92"))
+TTL_SECONDS = float(os.environ.get("BB_ANSWER_CACHE_TTL", str(24 * 3600)))
+MAX_ENTRIES = int(os.environ.get("BB_ANSWER_CACHE_MAX", "5000"))
+
+# How often (seconds) a worker checks the database for entries added elsewhere.
+SYNC_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    reply TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+"""
+
+class SemanticCache:
+    def __init__(self, dim, path=CACHE_PATH, threshold=SIMILARITY_THRESHOLD,
+                 ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.dim = dim
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "inserts": 0,
+                      "llm_calls": 0, "llm_seconds": 0.0}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._conn = None
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        self._last_seen_id = 0
+        self._last_sync = 0.0
+
+    def _db(self):
+        # SQLite connections must not cross a fork; open a fresh one per process.
+        if self._conn is None or self._pid != os.getpid():
+            self._reset()
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _sync(self, force=False):
+        # Pull entries written by other workers since the last sync.
+        now = time.time()
+        if not force and now - self._last_sync < SYNC_INTERVAL:
+            return
+        self._last_sync = now
+        rows = self._db().execute(
+            "SELECT id, embedding FROM answers WHERE id > ? ORDER BY id", (self._last_seen_id,)
+        ).fetchall()
+        if not rows:
+            return
+        ids = np.array([r[0] for r in rows], dtype="int64")
+        embs = np.vstack([np.frombuffer(r[1], dtype="float32") for r in rows])
+        self._index.add_with_ids(embs, ids)
+        self._last_seen_id = int(ids[-1])
+
+    def _drop(self, ids):
+        if len(ids):
+            self._index.remove_ids(np.asarray(ids, dtype="int64"))
+
+    def lookup(self, q_emb):
+        # q_emb: L2-normalised float32 array of shape (1, dim).
+        if not CACHE_ENABLED:
+            return None
+        with self._lock:
+            db = self._db()
+            self._sync()
+            if self._index.ntotal == 0:
+                self.stats["misses"] += 1
+                return None
+            D, I = self._index.search(q_emb, 1)
+            score, entry_id = float(D[0][0]), int(I[0][0])
+            if entry_id < 0 or score < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            row = db.execute("SELECT reply, created FROM answers WHERE id = ?", (entry_id,)).fetchone()
+            if row is None:
+                # Evicted by another worker.
+                self._drop([entry_id])
+                self.stats["misses"] += 1
+                return None
+            reply, created = row
+            now = time.time()
+            if now - created > self.ttl:
+                db.execute("DELETE FROM answers WHERE id = ?", (entry_id,))
+                self._drop([entry_id])
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, entry_id))
+            self.stats["hits"] += 1
+            return reply
+
+    def put(self, q_emb, query, reply):
+        if not CACHE_ENABLED:
+            return
+        with self._lock:
+            db = self._db()
+            now = time.time()
+            emb = np.ascontiguousarray(q_emb[0], dtype="float32")
+            db.execute(
+                "INSERT INTO answers (query, reply, embedding, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (query, reply, emb.tobytes(), now, now),
+            )
+            self.stats["inserts"] += 1
+            self._evict(db, now)
+            self._sync(force=True)
+
+    def _evict(self, db, now):
+        expired = [r[0] for r in db.execute(
+            "SELECT id FROM answers WHERE created < ?", (now - self.ttl,)
+        )]
+        if expired:
+            db.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in expired])
+            self._drop(expired)
+            self.stats["expirations"] += len(expired)
+
+        (count,) = db.execute("SELECT COUNT(*) FROM answers").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            # Least recently used first.
+            victims = [r[0] for r in db.execute(
+                "SELECT id FROM answers ORDER BY last_used ASC LIMIT ?", (overflow,)
+            )]
+            db.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in victims])
+            self._drop(victims)
+            self.stats["evictions"] += len(victims)
+
+    def record_llm_call(self, seconds):
+        # Timing of the LLM calls made on misses, used to estimate what hits save.
+        with self._lock:
+            self.stats["llm_calls"] += 1
+            self.stats["llm_seconds"] += seconds
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM answers")
+            self._index.reset()
+
+    def summary(self):
+        with self._lock:
+            (size,) = self._db().execute("SELECT COUNT(*) FROM answers").fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        avg_llm = self.stats["llm_seconds"] / self.stats["llm_calls"] if self.stats["llm_calls"] else 0.0
+        return dict(
+            self.stats,
+            size=size,
+            hit_rate=(self.stats["hits"] / lookups) if lookups else 0.0,
+            est_seconds_saved=self.stats["hits"] * avg_llm,
+            threshold=self.threshold,
+            ttl_s=self.ttl,
+            max_entries=self.max_entries,
+            enabled=CACHE_ENABLED,
+        )
+
+def clear_entries(path=CACHE_PATH):
+    # Drops every cached reply without loading anything, e.g. from ingest.py
+    # when the knowledge base changes. Workers discard their in-memory copies
+    # as their lookups find the rows gone.
+    if not os.path.exists(path):
+        return
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    try:
+        conn.executescript(SCHEMA)
+        conn.execute("DELETE FROM answers")
+    finally:
+        conn.close()
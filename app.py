@@ -1,60 +1,61 @@
 import os
 import re
+import hmac
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import faiss
 import openai  # <-- NEW
-from PyPDF2 import PdfReader
-from sentence_transformers import SentenceTransformer
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import metrics
+import resources
+from batcher import MicroBatcher
+from prompt import build_messages as assemble_messages, compact_prompt, record_usage, usage_totals
 
 # ---------------- API Setup ----------------
 openai.api_key = "YOUR_OPENAI_API_KEY"   # <-- PUT YOUR KEY HERE
 MODEL_NAME = "gpt-5-nano-2025-08-07"     # <-- UPDATED MODEL
 
-# ---------------- Load PDF ----------------
-pdf_path = "Canadian_Immigration_Knowledge_Base.pdf"
-if not os.path.exists(pdf_path):
-    raise FileNotFoundError(f"❌ Could not find {pdf_path}. Upload it to your repo.")
-
-print(f"Loading knowledge base from {pdf_path}...")
-reader = PdfReader(pdf_path)
-raw_text = " ".join([page.extract_text() for page in reader.pages if page.extract_text()])
-
-# ---------------- Clean & Chunk ----------------
-def chunk_text(text, chunk_size=1000, overlap=150):
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        cut = chunk.rfind(". ")
-        if cut > 0 and cut > chunk_size - 300:
-            chunk = chunk[:cut+1]
-            end = start + cut + 1
-        chunks.append(chunk.strip())
-        start = max(end - overlap, end)
-    return [c for c in chunks if len(c) > 50]
-
-docs = chunk_text(raw_text, chunk_size=1200, overlap=200)
-print(f"Total chunks: {len(docs)}")
-
-# ---------------- Embeddings ----------------
-embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-embs = embedder.encode(docs, convert_to_numpy=True, show_progress_bar=True).astype("float32")
-
-dim = embs.shape[1]
-index = faiss.IndexFlatIP(dim)
-faiss.normalize_L2(embs)
-index.add(embs)
-
-id2chunk = {i: docs[i] for i in range(len(docs))}
-
-def retrieve(query, k=3):
-    q_emb = embedder.encode([query], convert_to_numpy=True).astype("float32")
-    faiss.normalize_L2(q_emb)
-    D, I = index.search(q_emb, k)
-    return [id2chunk[i] for i in I[0]]
+# Required as "Authorization: Bearer <token>" on /admin routes; they are disabled when unset.
+ADMIN_TOKEN = os.environ.get("BB_ADMIN_TOKEN", "")
+
+# Limits for the bulk /retrieve and /chat/batch endpoints (offline evaluation).
+BULK_MAX_ITEMS = int(os.environ.get("BB_BULK_MAX_ITEMS", "256"))
+BULK_CHAT_CONCURRENCY = int(os.environ.get("BB_BULK_CHAT_CONCURRENCY", "8"))
+BULK_MAX_K = int(os.environ.get("BB_BULK_MAX_K", "50"))
+
+# ---------------- Retrieval ----------------
+# The embedder and the knowledge base index are loaded lazily by resources.py
+# (see index_store.py for the on-disk store and ingest.py for how it is built).
+RETRIEVE_K = 3
+
+def search_batch(requests):
+    # requests: list of (query, k). One batched encode and one batched
+    # index.search for all of them; returns (q_emb, chunks) per request.
+    queries = [query for query, _ in requests]
+    k = max(k for _, k in requests)
+    embedder = resources.get_embedder()
+    with metrics.timer("query_embedding"):
+        q_embs = embedder.encode(queries, convert_to_numpy=True, batch_size=len(queries)).astype("float32")
+        faiss.normalize_L2(q_embs)
+    docs, index = resources.get_store()
+    with metrics.timer("faiss_search"):
+        D, I = index.search(q_embs, k)
+    return [
+        (q_embs[n:n+1], [docs[i] for i in I[n][:k_n] if i >= 0])
+        for n, (_, k_n) in enumerate(requests)
+    ]
+
+# Concurrent requests are coalesced into one search_batch call (batcher.py).
+retrieval_batcher = MicroBatcher(search_batch, name="bb-retrieval-batcher")
+
+def embed_and_retrieve(query, k=RETRIEVE_K):
+    return retrieval_batcher((query, k))
+
+def retrieve(query, k=RETRIEVE_K):
+    return embed_and_retrieve(query, k)[1]
 
 # ---------------- System Prompt ----------------
 SALES_SYSTEM_PROMPT = '''
@@ -118,38 +119,221 @@ The most important purpose of the chatbot is not only to answer questions but to
 
 '''
 
+# Compacted once; sent byte-identical as the first message of every request
+# so the provider's prompt cache applies (see prompt.py).
+STATIC_SYSTEM_PROMPT = compact_prompt(SALES_SYSTEM_PROMPT)
+
 # ---------------- Chat Function ----------------
+def build_messages(user_query, chunks):
+    return assemble_messages(STATIC_SYSTEM_PROMPT, user_query, chunks, MODEL_NAME)
+
+def cached_reply(q_emb):
+    with metrics.timer("cache_lookup"):
+        return resources.get_answer_cache().lookup(q_emb)
+
 def chat(user_query, model=MODEL_NAME):
-    context = "\n".join(retrieve(user_query))
+    # Near-identical questions are answered from the semantic cache (answer_cache.py).
+    q_emb, chunks = embed_and_retrieve(user_query)
+    cache = resources.get_answer_cache()
+    cached = cached_reply(q_emb)
+    if cached is not None:
+        return cached
+
+    messages = build_messages(user_query, chunks)
     try:
-        completion = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": SALES_SYSTEM_PROMPT + "\n\nContext:\n" + context},
-                {"role": "user", "content": user_query},
-            ],
-        )
-        return completion["choices"][0]["message"]["content"]
+        started = time.perf_counter()
+        completion = openai.ChatCompletion.create(model=model, messages=messages)
+        seconds = time.perf_counter() - started
+        metrics.observe("llm_wait", seconds)
+        cache.record_llm_call(seconds)
+        reply = completion["choices"][0]["message"]["content"]
+        record_usage(completion.get("usage"), messages, reply, model, seconds)
+        if reply:
+            cache.put(q_emb, user_query, reply)
+        return reply
 
     except Exception as e:
         return f"⚠️ API Error: {str(e)}"
 
+def chat_stream(user_query, model=MODEL_NAME):
+    # Same as chat(), but yields the reply piece by piece as the API produces it.
+    q_emb, chunks = embed_and_retrieve(user_query)
+    cache = resources.get_answer_cache()
+    cached = cached_reply(q_emb)
+    if cached is not None:
+        yield cached
+        return
+
+    messages = build_messages(user_query, chunks)
+    started = time.perf_counter()
+    pieces, usage = [], None
+    for chunk in openai.ChatCompletion.create(model=model, messages=messages, stream=True,
+                                              stream_options={"include_usage": True}):
+        # The final chunk carries usage and no choices.
+        usage = chunk.get("usage") or usage
+        delta = chunk["choices"][0].get("delta", {}).get("content") if chunk.get("choices") else None
+        if delta:
+            if not pieces:
+                metrics.observe("llm_first_token", time.perf_counter() - started)
+            pieces.append(delta)
+            yield delta
+    seconds = time.perf_counter() - started
+    metrics.observe("llm_wait", seconds)
+    cache.record_llm_call(seconds)
+    reply = "".join(pieces)
+    record_usage(usage, messages, reply, model, seconds)
+    if reply:  # never cache an empty stream
+        cache.put(q_emb, user_query, reply)
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 # ---------------- Flask API ----------------
 app = Flask(__name__)
 CORS(app)
 
 @app.route("/")
 def health_check():
+    # Liveness: the process is up and serving, even while models are still loading.
     return "The API is running!"
 
+@app.route("/ready")
+def readiness_check():
+    # Readiness: only route traffic here once the model and index are loaded.
+    if not resources.is_ready():
+        resources.warm_up_async()
+        return jsonify(resources.status()), 503
+    return jsonify(resources.status())
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(answer_cache_summary())
+
+def answer_cache_summary():
+    # Stats must not trigger the model load on a cold worker.
+    cache = resources.peek_answer_cache()
+    return dict(cache.summary(), loaded=True) if cache else {"loaded": False}
+
+def runtime_metrics():
+    # Counters and gauges exported next to the stage timers on /metrics.
+    # Answer cache metrics are omitted until the cache exists (value None).
+    cache = resources.peek_answer_cache()
+    cache = cache.summary() if cache else {}
+    batcher = retrieval_batcher.summary()
+    return {
+        "bearbot_answer_cache_hits_total": ("counter", "Answers served from the semantic cache.", cache.get("hits")),
+        "bearbot_answer_cache_misses_total": ("counter", "Semantic cache lookups that missed.", cache.get("misses")),
+        "bearbot_answer_cache_entries": ("gauge", "Answers in the semantic cache.", cache.get("size")),
+        "bearbot_llm_calls_total": ("counter", "Chat completions requested from the LLM.", cache.get("llm_calls")),
+        "bearbot_prompt_tokens_total": ("counter", "Prompt tokens sent to the LLM.", usage_totals["prompt_tokens"]),
+        "bearbot_cached_prompt_tokens_total": ("counter", "Prompt tokens served from the provider's prompt cache.",
+                                               usage_totals["cached_prompt_tokens"]),
+        "bearbot_completion_tokens_total": ("counter", "Completion tokens received from the LLM.",
+                                            usage_totals["completion_tokens"]),
+        "bearbot_retrieval_batches_total": ("counter", "Batched retrieval calls.", batcher["batches"]),
+        "bearbot_retrieval_items_total": ("counter", "Queries retrieved through the batcher.", batcher["items"]),
+    }
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Prometheus text format; per process, so scrape each worker (or use a
+    # single worker) when running under gunicorn.
+    return Response(metrics.render_prometheus(runtime_metrics()), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/chat", methods=["POST"])
 def handle_chat():
     user_message = request.json.get("message")
     if not user_message:
         return jsonify({"error": "No message provided"}), 400
 
+    if wants_stream():
+        return stream_chat(user_message)
+
     bot_response = chat(user_message)
     return jsonify({"reply": bot_response})
 
+def wants_stream():
+    # Clients opt in with {"stream": true} or "Accept: text/event-stream";
+    # everyone else keeps getting a single {"reply": ...} JSON object.
+    return bool(request.json.get("stream")) or request.accept_mimetypes.best == "text/event-stream"
+
+def stream_chat(user_message):
+    # Server-Sent Events: one "data" event per token delta, then a "done"
+    # event carrying the full reply (or an "error" event).
+    def events():
+        pieces = []
+        try:
+            for delta in chat_stream(user_message):
+                pieces.append(delta)
+                yield sse_event({"delta": delta})
+        except Exception as e:
+            yield sse_event({"error": f"⚠️ API Error: {str(e)}"}, event="error")
+            return
+        yield sse_event({"reply": "".join(pieces)}, event="done")
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ---------------- Bulk API ----------------
+def bulk_items(key):
+    # Returns (items, None) or (None, error_response).
+    items = (request.json or {}).get(key)
+    if not isinstance(items, list) or not items or not all(isinstance(x, str) and x for x in items):
+        return None, (jsonify({"error": f"'{key}' must be a non-empty list of strings"}), 400)
+    if len(items) > BULK_MAX_ITEMS:
+        return None, (jsonify({"error": f"At most {BULK_MAX_ITEMS} {key} per request"}), 413)
+    return items, None
+
+def parse_k(value):
+    # Returns k if it is a JSON integer in [1, BULK_MAX_K], else None (no coercion).
+    if not isinstance(value, int) or isinstance(value, bool):
+        return None
+    return value if 1 <= value <= BULK_MAX_K else None
+
+@app.route("/retrieve", methods=["POST"])
+def handle_retrieve():
+    queries, error = bulk_items("queries")
+    if error:
+        return error
+    k = parse_k(request.json.get("k", RETRIEVE_K))
+    if k is None:
+        return jsonify({"error": f"'k' must be an integer from 1 to {BULK_MAX_K}"}), 400
+    results = search_batch([(query, k) for query in queries])
+    return jsonify({"results": [
+        {"query": query, "chunks": chunks} for query, (_, chunks) in zip(queries, results)
+    ]})
+
+@app.route("/chat/batch", methods=["POST"])
+def handle_chat_batch():
+    messages, error = bulk_items("messages")
+    if error:
+        return error
+    # Run the chats concurrently; their retrievals are coalesced by the batcher.
+    with ThreadPoolExecutor(max_workers=BULK_CHAT_CONCURRENCY) as pool:
+        replies = list(pool.map(chat, messages))
+    return jsonify({"replies": [{"reply": reply} for reply in replies]})
+
+# ---------------- Admin API ----------------
+def is_admin(authorization):
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(authorization or "", f"Bearer {ADMIN_TOKEN}")
+
+@app.route("/admin/reload", methods=["GET", "POST"])
+def handle_reload():
+    # POST re-ingests new/changed/removed documents in the background (see
+    # ingest.py); every worker switches to the new version on its own. GET
+    # reports the last run.
+    if not is_admin(request.headers.get("Authorization")):
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == "POST":
+        full = bool((request.get_json(silent=True) or {}).get("full"))
+        started = resources.reload_async(full)
+        return jsonify(dict(resources.reload_status(), started=started)), 202
+    return jsonify(resources.reload_status())
+
 if __name__ == "__main__":
+    resources.warm_up_async()
     app.run(host="0.0.0.0", port=8000)
@@ -0,0 +1,203 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import metrics
+import resources
+from app import (BULK_CHAT_CONCURRENCY, BULK_MAX_ITEMS, BULK_MAX_K, MODEL_NAME, RETRIEVE_K, answer_cache_summary,
+                 build_messages, cached_reply, is_admin, parse_k, retrieval_batcher, runtime_metrics, search_batch,
+                 sse_event)
+from llm_client import AsyncLLMClient, LLMError, to_llm_error
+from prompt import record_usage
+
+# ---------------- Async Serving Mode ----------------
+# The same routes as the Flask app in app.py, served from an event loop so a
+# single process can hold hundreds of chats that are waiting on the LLM.
+# Embedding and FAISS search go through the retrieval batcher and the answer
+# cache runs in the thread pool; only the LLM call is awaited on the loop.
+#
+# Run with: uvicorn asgi:app --host 0.0.0.0 --port 8000
+#
+# Unlike the Flask app, failures come back as proper status codes
+# (429 / 502 / 503 / 504) with {"error": ...} instead of a 200 "reply".
+
+llm = AsyncLLMClient()
+
+async def health_check(request):
+    return PlainTextResponse("The API is running!")
+
+async def readiness_check(request):
+    if not resources.is_ready():
+        resources.warm_up_async()
+        return JSONResponse(resources.status(), status_code=503)
+    return JSONResponse(resources.status())
+
+async def cache_stats(request):
+    summary = await run_in_threadpool(answer_cache_summary)
+    summary["llm_client"] = dict(llm.stats, concurrency=llm.concurrency, timeout_s=llm.timeout)
+    return JSONResponse(summary)
+
+async def metrics_endpoint(request):
+    extra = await run_in_threadpool(runtime_metrics)
+    extra["bearbot_llm_retries_total"] = ("counter", "LLM calls retried after a transient error.", llm.stats["retries"])
+    extra["bearbot_llm_errors_total"] = ("counter", "LLM calls that failed after retries.", llm.stats["errors"])
+    extra["bearbot_llm_in_flight"] = ("gauge", "LLM calls currently in flight.", llm.stats["in_flight"])
+    return Response(metrics.render_prometheus(extra), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+async def prepare(user_query):
+    # Returns (q_emb, cached_reply, messages); messages is None on a cache hit.
+    # The retrieval batcher's Future is awaited directly, so waiting for a
+    # batch does not occupy a thread-pool slot.
+    q_emb, chunks = await asyncio.wrap_future(retrieval_batcher.submit((user_query, RETRIEVE_K)))
+    cached = await run_in_threadpool(cached_reply, q_emb)
+    if cached is not None:
+        return q_emb, cached, None
+    return q_emb, None, build_messages(user_query, chunks)
+
+async def read_json(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+async def handle_chat(request):
+    body = await read_json(request)
+    user_message = body.get("message")
+    if not user_message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+
+    q_emb, cached, messages = await prepare(user_message)
+    stream = bool(body.get("stream")) or "text/event-stream" in request.headers.get("accept", "")
+
+    if stream:
+        return StreamingResponse(
+            stream_events(user_message, q_emb, cached, messages),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        reply = await complete(user_message, q_emb, cached, messages)
+    except LLMError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status)
+    return JSONResponse({"reply": reply})
+
+async def complete(user_message, q_emb, cached, messages):
+    if cached is not None:
+        return cached
+    cache = resources.get_answer_cache()
+    started = time.perf_counter()
+    reply, usage = await llm.complete(messages, MODEL_NAME)
+    seconds = time.perf_counter() - started
+    metrics.observe("llm_wait", seconds)
+    cache.record_llm_call(seconds)
+    record_usage(usage, messages, reply, MODEL_NAME, seconds)
+    if reply:
+        await run_in_threadpool(cache.put, q_emb, user_message, reply)
+    return reply
+
+async def stream_events(user_message, q_emb, cached, messages):
+    if cached is not None:
+        yield sse_event({"delta": cached})
+        yield sse_event({"reply": cached}, event="done")
+        return
+
+    cache = resources.get_answer_cache()
+    started = time.perf_counter()
+    pieces, usage = [], {}
+    try:
+        async for delta in llm.stream(messages, MODEL_NAME, usage):
+            if not pieces:
+                metrics.observe("llm_first_token", time.perf_counter() - started)
+            pieces.append(delta)
+            yield sse_event({"delta": delta})
+    except Exception as e:
+        # Headers are already sent, so the status goes in the event instead.
+        error = to_llm_error(e)
+        yield sse_event({"error": str(error), "status": error.status}, event="error")
+        return
+    reply = "".join(pieces)
+    seconds = time.perf_counter() - started
+    metrics.observe("llm_wait", seconds)
+    cache.record_llm_call(seconds)
+    record_usage(usage, messages, reply, MODEL_NAME, seconds)
+    if reply:
+        await run_in_threadpool(cache.put, q_emb, user_message, reply)
+    yield sse_event({"reply": reply}, event="done")
+
+# ---------------- Bulk API ----------------
+def bulk_items(body, key):
+    # Returns (items, None) or (None, error_response).
+    items = body.get(key)
+    if not isinstance(items, list) or not items or not all(isinstance(x, str) and x for x in items):
+        return None, JSONResponse({"error": f"'{key}' must be a non-empty list of strings"}, status_code=400)
+    if len(items) > BULK_MAX_ITEMS:
+        return None, JSONResponse({"error": f"At most {BULK_MAX_ITEMS} {key} per request"}, status_code=413)
+    return items, None
+
+async def handle_retrieve(request):
+    body = await read_json(request)
+    queries, error = bulk_items(body, "queries")
+    if error:
+        return error
+    k = parse_k(body.get("k", RETRIEVE_K))
+    if k is None:
+        return JSONResponse({"error": f"'k' must be an integer from 1 to {BULK_MAX_K}"}, status_code=400)
+    results = await run_in_threadpool(search_batch, [(query, k) for query in queries])
+    return JSONResponse({"results": [
+        {"query": query, "chunks": chunks} for query, (_, chunks) in zip(queries, results)
+    ]})
+
+async def handle_chat_batch(request):
+    body = await read_json(request)
+    messages, error = bulk_items(body, "messages")
+    if error:
+        return error
+    limit = asyncio.Semaphore(BULK_CHAT_CONCURRENCY)
+
+    async def one(user_message):
+        async with limit:
+            try:
+                return {"reply": await complete(user_message, *await prepare(user_message))}
+            except LLMError as e:
+                return {"error": str(e), "status": e.status}
+
+    return JSONResponse({"replies": await asyncio.gather(*(one(m) for m in messages))})
+
+# ---------------- Admin API ----------------
+async def handle_reload(request):
+    if not is_admin(request.headers.get("authorization")):
+        return JSONResponse({"error": "Forbidden"}, status_code=403)
+    if request.method == "POST":
+        full = bool((await read_json(request)).get("full"))
+        started = resources.reload_async(full)
+        return JSONResponse(dict(resources.reload_status(), started=started), status_code=202)
+    return JSONResponse(resources.reload_status())
+
+@asynccontextmanager
+async def lifespan(app):
+    resources.warm_up_async()
+    yield
+    await llm.close()
+
+app = Starlette(
+    routes=[
+        Route("/", health_check),
+        Route("/ready", readiness_check),
+        Route("/cache/stats", cache_stats),
+        Route("/metrics", metrics_endpoint),
+        Route("/chat", handle_chat, methods=["POST"]),
+        Route("/chat/batch", handle_chat_batch, methods=["POST"]),
+        Route("/retrieve", handle_retrieve, methods=["POST"]),
+        Route("/admin/reload", handle_reload, methods=["GET", "POST"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,94 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+# ---------------- Micro-Batching ----------------
+# Collects items submitted concurrently (from request threads or the event
+# loop) for up to max_wait_ms or max_batch_size items, whichever comes first,
+# runs them through one call of fn(items) -> results, and hands each caller
+# its own result through a Future.
+#
+# submit() never runs fn on the caller's thread, so it is safe to await from
+# an event loop; calling the batcher directly blocks, and with batching off
+# (max_batch_size 1) just runs fn inline on the calling thread.
+
+BATCH_MAX_SIZE = int(os.environ.get("BB_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BB_BATCH_MAX_WAIT_MS", "5"))
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, name="batcher"):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.stats = {"batches": 0, "items": 0, "max_batch": 0}
+        self._queue = None
+        self._worker = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # The worker thread does not survive fork; each process starts its own.
+        if self._pid == os.getpid() and self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._worker is not None and self._worker.is_alive():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        if self.max_batch_size == 1:
+            # Batching disabled: the caller waits anyway, so skip the thread hop.
+            future = Future()
+            self._run_batch([(item, future)])
+            return future.result()
+        return self.submit(item).result()
+
+    def _run(self):
+        q = self._queue
+        while True:
+            batch = [q.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.fn(items)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        self.stats["batches"] += 1
+        self.stats["items"] += len(batch)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+    def summary(self):
+        batches = self.stats["batches"]
+        return dict(
+            self.stats,
+            avg_batch=(self.stats["items"] / batches) if batches else 0.0,
+            max_batch_size=self.max_batch_size,
+            max_wait_ms=self.max_wait * 1000.0,
+        )
@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import resource
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------- Benchmark ----------------
+# Drives the Flask app (app.py) or the async app (asgi.py) in-process under
+# concurrent load, with the OpenAI call replaced by a local stand-in whose
+# latency and token rate are configurable, so runs are free, offline and
+# repeatable. Reports latency percentiles, throughput, peak RSS, cold-start
+# time and the per-stage timings from metrics.py.
+#
+#   python bench.py --mode flask --concurrency 16 --requests 400
+#   python bench.py --mode asgi --stream --llm-latency 0.8 --json bench.json
+#   python bench.py --fake-embedder          # no model download needed
+#
+# The answer cache is disabled unless --answer-cache is given, so every
+# request goes through retrieval and the (fake) LLM.
+
+QUESTIONS = [
+    "How can I study in Canada as an international student?",
+    "What is Express Entry and how is the CRS score calculated?",
+    "I am from Pakistan, how do I immigrate to Canada?",
+    "Can I sponsor my parents and grandparents?",
+    "How do I get a work permit with an LMIA?",
+    "What is the Canadian Experience Class?",
+    "Do I qualify for the Federal Skilled Worker program?",
+    "How does the Start-up Visa program work?",
+    "I was refused a visa before, am I inadmissible?",
+    "How long until I can apply for Canadian citizenship?",
+    "Can I visit Canada on a tourist visa?",
+    "How do I book a consultation with you?",
+]
+
+FAKE_REPLY = ("Great question! Canada offers several pathways that may fit your profile, and our team can "
+              "review your options in detail. Start here: https://canadaforimmigration.com/free-assessment/ "
+              "Contact us at +1 647 948 8159 or contact@canadaforimmigration.com to book a consultation.").split()
+
+# ---------------- Fake LLM ----------------
+class FakeLLM:
+    # Stands in for openai.ChatCompletion.create/acreate. Waits `latency`
+    # seconds (± jitter) before the first token, then one token every
+    # `token_interval` seconds; returns usage like the real API.
+    def __init__(self, latency=0.5, tokens=60, token_interval=0.01, jitter=0.2, seed=0):
+        self.latency = latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def install(self):
+        import openai
+        openai.ChatCompletion.create = self.create
+        openai.ChatCompletion.acreate = self.acreate
+
+    def _delay(self):
+        with self._random_lock:
+            return max(0.0, self.latency * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _reply(self):
+        return [FAKE_REPLY[i % len(FAKE_REPLY)] + " " for i in range(self.tokens)]
+
+    def _usage(self, messages):
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": self.tokens,
+                "total_tokens": prompt_tokens + self.tokens}
+
+    def create(self, model=None, messages=(), stream=False, **kwargs):
+        time.sleep(self._delay())
+        if not stream:
+            time.sleep(self.token_interval * self.tokens)
+            return self._completion(messages)
+
+        def chunks():
+            for n, token in enumerate(self._reply()):
+                if n:
+                    time.sleep(self.token_interval)
+                yield {"choices": [{"delta": {"content": token}}]}
+            yield {"choices": [], "usage": self._usage(messages)}
+        return chunks()
+
+    async def acreate(self, model=None, messages=(), stream=False, **kwargs):
+        await asyncio.sleep(self._delay())
+        if not stream:
+            await asyncio.sleep(self.token_interval * self.tokens)
+            return self._completion(messages)
+
+        async def chunks():
+            for n, token in enumerate(self._reply()):
+                if n:
+                    await asyncio.sleep(self.token_interval)
+                yield {"choices": [{"delta": {"content": token}}]}
+            yield {"choices": [], "usage": self._usage(messages)}
+        return chunks()
+
+    def _completion(self, messages):
+        return {"choices": [{"message": {"content": "".join(self._reply()).strip()}}],
+                "usage": self._usage(messages)}
+
+class FakeEmbedder:
+    # Deterministic hash-seeded vectors with the same dimension as the real
+    # model, for machines that cannot download it. Retrieval quality is
+    # meaningless; the index and search costs are not.
+    dim = 384
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        import numpy as np
+        rows = [np.random.RandomState(int(hashlib.sha256(t.encode("utf-8")).hexdigest()[:8], 16)).rand(self.dim)
+                for t in texts]
+        return np.array(rows, dtype="float32")
+
+# ---------------- Setup ----------------
+def configure_env(args):
+    # Must run before app/resources are imported: they read config at import.
+    scratch = os.path.join(tempfile.gettempdir(), "bb-bench")
+    os.environ.setdefault("BB_ANSWER_CACHE_PATH", os.path.join(scratch, "answer_cache.sqlite3"))
+    if not args.answer_cache:
+        os.environ["BB_ANSWER_CACHE"] = "0"
+    if args.fake_embedder:
+        # Never mix fake vectors into the real store.
+        os.environ.setdefault("BB_INDEX_DIR", os.path.join(scratch, "index_cache"))
+    os.makedirs(scratch, exist_ok=True)
+
+def install_fakes(args):
+    import resources
+    if args.fake_embedder:
+        resources._load_embedder = FakeEmbedder
+    FakeLLM(args.llm_latency, args.llm_tokens, args.token_interval, args.llm_jitter).install()
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def cold_start_probe(args):
+    # Runs in a fresh interpreter: time to import the app and load the model and index.
+    started = time.perf_counter()
+    import app
+    import metrics
+    install_fakes(args)
+    imported = time.perf_counter()
+    app.resources.warm_up()
+    ready = time.perf_counter()
+    print(json.dumps({"import_s": imported - started, "warm_up_s": ready - imported,
+                      "stages": metrics.summary(), "peak_rss_mb": peak_rss_mb()}))
+
+def measure_cold_start(args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--cold-start-probe"]
+    if args.fake_embedder:
+        cmd.append("--fake-embedder")
+    started = time.perf_counter()
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - started
+    return result
+
+# ---------------- Load ----------------
+class Sample:
+    __slots__ = ("latency", "ttfb", "ok")
+
+    def __init__(self, latency, ttfb, ok):
+        self.latency = latency
+        self.ttfb = ttfb
+        self.ok = ok
+
+def request_body(n, args):
+    question = QUESTIONS[n % len(QUESTIONS)]
+    if args.unique:
+        question = f"{question} (#{n})"
+    return {"message": question, "stream": args.stream}
+
+def run_flask(args, total):
+    import app
+    local = threading.local()
+
+    def one(n):
+        client = getattr(local, "client", None) or app.app.test_client()
+        local.client = client
+        started = time.perf_counter()
+        response = client.post("/chat", json=request_body(n, args), buffered=False)
+        ttfb, body = None, []
+        for chunk in response.response:
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            body.append(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        response.close()
+        latency = time.perf_counter() - started
+        return Sample(latency, ttfb or latency, response_ok(response.status_code, b"".join(body)))
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(one, range(total)))
+
+async def call_asgi(asgi_app, path, body):
+    # Minimal ASGI client: records when the first body bytes are sent, which
+    # httpx's ASGITransport hides by buffering the whole response.
+    payload = json.dumps(body).encode("utf-8")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode("ascii"), "query_string": b"",
+        "root_path": "", "client": ("127.0.0.1", 0), "server": ("bench", 80),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+    }
+    finished = asyncio.Event()
+    state = {"sent": False, "status": None, "ttfb": None, "body": []}
+    started = time.perf_counter()
+
+    async def receive():
+        if not state["sent"]:
+            state["sent"] = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                if state["ttfb"] is None:
+                    state["ttfb"] = time.perf_counter() - started
+                state["body"].append(message["body"])
+            if not message.get("more_body"):
+                finished.set()
+
+    await asgi_app(scope, receive, send)
+    finished.set()
+    latency = time.perf_counter() - started
+    return Sample(latency, state["ttfb"] or latency, response_ok(state["status"], b"".join(state["body"])))
+
+def run_asgi(args, total):
+    import asgi
+
+    async def main():
+        limit = asyncio.Semaphore(args.concurrency)
+
+        async def one(n):
+            async with limit:
+                return await call_asgi(asgi.app, "/chat", request_body(n, args))
+
+        try:
+            return await asyncio.gather(*(one(n) for n in range(total)))
+        finally:
+            await asgi.llm.close()
+
+    return asyncio.run(main())
+
+def response_ok(status, body):
+    return status == 200 and b"API Error" not in body and b"event: error" not in body
+
+# ---------------- Report ----------------
+def percentiles(values):
+    import metrics
+    return {f"p{q}_ms": metrics.percentile(values, q) * 1000.0 for q in (50, 95, 99)}
+
+def run(args):
+    import metrics
+    import resources
+    install_fakes(args)
+    runner = run_flask if args.mode == "flask" else run_asgi
+
+    cold_start = None if args.skip_cold_start else measure_cold_start(args)
+    resources.warm_up()
+    if args.warmup:
+        runner(args, args.warmup)
+    metrics.reset()
+
+    started = time.perf_counter()
+    samples = runner(args, args.requests)
+    wall = time.perf_counter() - started
+
+    latencies = [s.latency for s in samples]
+    return {
+        "mode": args.mode,
+        "stream": args.stream,
+        "concurrency": args.concurrency,
+        "requests": len(samples),
+        "errors": sum(not s.ok for s in samples),
+        "seconds": wall,
+        "rps": len(samples) / wall if wall else 0.0,
+        "latency": percentiles(latencies),
+        "first_byte": percentiles([s.ttfb for s in samples]),
+        "peak_rss_mb": peak_rss_mb(),
+        "cold_start": cold_start,
+        "llm": {"latency_s": args.llm_latency, "tokens": args.llm_tokens, "token_interval_s": args.token_interval},
+        "stages": metrics.summary(),
+    }
+
+def print_report(report):
+    print(f"\n{report['mode']} | stream={report['stream']} | concurrency={report['concurrency']} | "
+          f"{report['requests']} requests in {report['seconds']:.2f}s | {report['rps']:.1f} req/s | "
+          f"{report['errors']} errors")
+    for name in ("latency", "first_byte"):
+        p = report[name]
+        print(f"{name:<11} p50 {p['p50_ms']:8.1f} ms   p95 {p['p95_ms']:8.1f} ms   p99 {p['p99_ms']:8.1f} ms")
+    print(f"peak RSS    {report['peak_rss_mb']:.0f} MB")
+    cold = report["cold_start"]
+    if cold:
+        print(f"cold start  {cold['process_s']:.2f}s process (import {cold['import_s']:.2f}s, "
+              f"warm-up {cold['warm_up_s']:.2f}s, RSS {cold['peak_rss_mb']:.0f} MB)")
+
+    print(f"\n{'stage':<18}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    stages = dict((cold or {}).get("stages", {}), **report["stages"])
+    for name, s in stages.items():
+        print(f"{name:<18}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+              f"{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['total_s']:>10.2f}")
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the chatbot in-process against a fake LLM.")
+    parser.add_argument("--mode", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--stream", action="store_true", help="request SSE streaming replies")
+    parser.add_argument("--unique", action="store_true", help="make every question distinct")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="± fraction applied to --llm-latency")
+    parser.add_argument("--llm-tokens", type=int, default=60, help="tokens per reply")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="seconds between tokens")
+    parser.add_argument("--fake-embedder", action="store_true", help="hash-based embeddings (no model download)")
+    parser.add_argument("--skip-cold-start", action="store_true")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    parser.add_argument("--cold-start-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    configure_env(args)
+    if args.cold_start_probe:
+        cold_start_probe(args)
+        return 0
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
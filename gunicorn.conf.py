@@ -0,0 +1,25 @@
+import gc
+import os
+
+# ---------------- Gunicorn Config ----------------
+# Run with: gunicorn -c gunicorn.conf.py app:app
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# Streamed replies keep a connection open for the whole generation; threaded
+# workers let other requests through in the meantime.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+# Import the app once in the master and load the model and index there, so the
+# forked workers share them copy-on-write instead of each loading their own copy.
+preload_app = True
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is forked.
+    import resources
+    resources.warm_up()
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers don't touch (and un-share) those pages.
+    gc.freeze()
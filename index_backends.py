@@ -0,0 +1,321 @@
+import os
+import sys
+import math
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+import faiss
+
+# ---------------- Index Backends ----------------
+# Everything behind retrieve() only needs .search(q_embs, k) -> (D, I),
+# .ntotal and .d, so any of these can be selected per deployment:
+#
+#   flat   exact inner-product search (the baseline, float32)
+#   ivf    inverted lists over k-means cells; nprobe trades recall for speed
+#   hnsw   graph search; efSearch trades recall for speed
+#   pq     product-quantised codes (~dim/8 bytes per vector instead of dim*4)
+#   sq8    int8 scalar quantisation (dim bytes per vector)
+#   ivfpq  inverted lists + product quantisation, for very large corpora
+#   chroma a chromadb collection (HNSW, persisted by chroma itself)
+#
+# All embeddings are L2-normalised, so inner product is cosine similarity.
+# FAISS indexes built with explicit ids return chunk ids rather than positions:
+# IVF indexes store the ids in their inverted lists, the others are wrapped in
+# IndexIDMap2.
+
+BACKENDS = ("flat", "ivf", "hnsw", "pq", "sq8", "ivfpq", "chroma")
+INDEX_BACKEND = os.environ.get("BB_INDEX_BACKEND", "flat")
+
+FAISS_INDEX_FILE = "index.faiss"
+CHROMA_DIR = "chroma"
+
+def build_params():
+    # Parameters baked into the index when it is built (part of its directory name).
+    return {
+        "nlist": int(os.environ.get("BB_IVF_NLIST", "0")),  # 0 = about 4 * sqrt(n)
+        "hnsw_m": int(os.environ.get("BB_HNSW_M", "32")),
+        "ef_construction": int(os.environ.get("BB_EF_CONSTRUCTION", "80")),
+        "pq_m": int(os.environ.get("BB_PQ_M", "0")),  # 0 = dim / 8
+        "pq_nbits": int(os.environ.get("BB_PQ_NBITS", "8")),
+    }
+
+def search_params():
+    # Parameters that can change at load time without rebuilding.
+    return {
+        "nprobe": int(os.environ.get("BB_NPROBE", "8")),
+        "ef_search": int(os.environ.get("BB_EF_SEARCH", "64")),
+    }
+
+# ---------------- Build ----------------
+def _nlist(n, requested):
+    # FAISS wants ~39 training points per cell; keep small corpora trainable.
+    nlist = requested or int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // 39 or 1))
+
+def _pq_shape(dim, n, m, nbits):
+    m = m or max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    # Training needs at least 2**nbits points per sub-quantiser.
+    nbits = max(1, min(nbits, int(math.log2(max(n, 2)))))
+    return m, nbits
+
+# Backends whose indexes can drop vectors in place; the others are rebuilt on change.
+REMOVABLE = ("flat", "ivf", "pq", "sq8", "ivfpq", "chroma")
+
+def build_index(embs, backend=INDEX_BACKEND, params=None, directory=None, ids=None):
+    params = dict(build_params(), **(params or {}))
+    n, dim = embs.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if backend == "chroma":
+        index = ChromaIndex(dim, os.path.join(directory, CHROMA_DIR) if directory else None)
+        index.add(embs, ids)
+        return index
+
+    if backend == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif backend == "ivf":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, _nlist(n, params["nlist"]), metric)
+    elif backend == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+    elif backend == "pq":
+        m, nbits = _pq_shape(dim, n, params["pq_m"], params["pq_nbits"])
+        index = faiss.IndexPQ(dim, m, nbits, metric)
+    elif backend == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, metric)
+    elif backend == "ivfpq":
+        m, nbits = _pq_shape(dim, n, params["pq_m"], params["pq_nbits"])
+        index = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, _nlist(n, params["nlist"]), m, nbits, metric)
+    else:
+        raise ValueError(f"Unknown index backend {backend!r}; choose one of {', '.join(BACKENDS)}")
+
+    if not index.is_trained and n:
+        index.train(embs)
+    if ids is None:
+        index.add(embs)
+        return index
+    # IndexIDMap2.remove_ids compacts its id map by position, which only
+    # matches indexes that compact their vectors the same way; IVF lists
+    # don't, so IVF keeps the ids itself.
+    if faiss.try_extract_index_ivf(index) is None:
+        index = faiss.IndexIDMap2(index)
+    if n:
+        index.add_with_ids(embs, ids)
+    return index
+
+def update_index(index, remove_ids, add_embs, add_ids):
+    # In-place update for REMOVABLE backends.
+    if len(remove_ids):
+        index.remove_ids(np.asarray(remove_ids, dtype="int64"))
+    if len(add_ids):
+        if isinstance(index, ChromaIndex):
+            index.add(add_embs, add_ids)
+        else:
+            index.add_with_ids(np.ascontiguousarray(add_embs), np.asarray(add_ids, dtype="int64"))
+    return index
+
+def configure(index, params=None):
+    # Apply nprobe / efSearch to whichever index type supports them.
+    params = dict(search_params(), **(params or {}))
+    if isinstance(index, ChromaIndex):
+        return index  # chroma's HNSW parameters are fixed in the collection metadata
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(params["nprobe"], ivf.nlist)
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if hasattr(inner, "hnsw"):
+        inner.hnsw.efSearch = params["ef_search"]
+    return index
+
+# ---------------- Save / Load ----------------
+def write_index(index, directory):
+    if isinstance(index, ChromaIndex):
+        return  # chroma persists the collection as it is written
+    faiss.write_index(index, os.path.join(directory, FAISS_INDEX_FILE))
+
+def copy_index(src_directory, dst_directory, backend=INDEX_BACKEND):
+    # Returns a writable copy of an index, for in-place updates into a new version.
+    if backend == "chroma":
+        shutil.copytree(os.path.join(src_directory, CHROMA_DIR), os.path.join(dst_directory, CHROMA_DIR))
+        return ChromaIndex.open(os.path.join(dst_directory, CHROMA_DIR))
+    return faiss.read_index(os.path.join(src_directory, FAISS_INDEX_FILE))
+
+def read_index(directory, backend=INDEX_BACKEND, mmap=True):
+    if backend == "chroma":
+        return configure(ChromaIndex.open(os.path.join(directory, CHROMA_DIR)))
+    path = os.path.join(directory, FAISS_INDEX_FILE)
+    # Memory-map the index file where FAISS supports it, so forked workers
+    # share the same pages through the OS page cache.
+    if mmap:
+        try:
+            return configure(faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY))
+        except (RuntimeError, AttributeError):
+            pass
+    return configure(faiss.read_index(path))
+
+def footprint_bytes(index):
+    # Serialises a copy of the index; only for in-memory indexes (evaluate()).
+    if isinstance(index, ChromaIndex):
+        return index.footprint_bytes()
+    return int(faiss.serialize_index(index).size)
+
+def stored_bytes(index, directory):
+    # Size of an index already written by write_index(), without copying it.
+    if isinstance(index, ChromaIndex):
+        return index.footprint_bytes()
+    return os.path.getsize(os.path.join(directory, FAISS_INDEX_FILE))
+
+# ---------------- Chroma ----------------
+class ChromaIndex:
+    # Adapts a chromadb collection to the FAISS search interface. Vector ids
+    # are stringified chunk ids (or positions), so results map back to the chunk store.
+    COLLECTION = "knowledge_base"
+
+    def __init__(self, dim, path=None, collection=None):
+        import chromadb
+        self.d = dim
+        self.path = path
+        if collection is None:
+            client = chromadb.PersistentClient(path=path) if path else chromadb.EphemeralClient()
+            collection = client.get_or_create_collection(
+                self.COLLECTION + ("" if path else f"_{id(self)}"),
+                metadata={"hnsw:space": "ip", "dim": dim},
+            )
+        self.collection = collection
+
+    @classmethod
+    def open(cls, path):
+        import chromadb
+        collection = chromadb.PersistentClient(path=path).get_collection(cls.COLLECTION)
+        return cls(collection.metadata["dim"], path, collection)
+
+    @property
+    def ntotal(self):
+        return self.collection.count()
+
+    def add(self, embs, ids=None):
+        start = self.ntotal
+        ids = range(start, start + len(embs)) if ids is None else ids
+        ids = [str(int(i)) for i in ids]
+        if not ids:
+            return
+        batch = 4096
+        for b in range(0, len(ids), batch):
+            self.collection.add(ids=ids[b:b + batch], embeddings=embs[b:b + batch].tolist())
+
+    def remove_ids(self, ids):
+        self.collection.delete(ids=[str(int(i)) for i in ids])
+
+    def search(self, q_embs, k):
+        k = min(k, max(self.ntotal, 1))
+        res = self.collection.query(query_embeddings=q_embs.tolist(), n_results=k, include=["distances"])
+        D = np.full((len(q_embs), k), -np.inf, dtype="float32")
+        I = np.full((len(q_embs), k), -1, dtype="int64")
+        for row, (ids, dists) in enumerate(zip(res["ids"], res["distances"])):
+            I[row, :len(ids)] = [int(i) for i in ids]
+            D[row, :len(dists)] = [1.0 - d for d in dists]  # chroma's "ip" distance is 1 - dot
+        return D, I
+
+    def footprint_bytes(self):
+        if not self.path:
+            return None
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(self.path) for name in names
+        )
+
+# ---------------- Evaluation ----------------
+def recall_at_k(truth_I, I, k):
+    # Fraction of the exact top-k neighbours that the approximate index also returned.
+    hits = sum(len(set(t[:k]) & set(a[:k])) for t, a in zip(truth_I, I))
+    return hits / float(truth_I.shape[0] * k)
+
+def evaluate(embs, queries, k=10, backends=BACKENDS, params=None):
+    flat = build_index(embs, "flat")
+    _, truth_I = flat.search(queries, k)
+
+    results = []
+    for backend in backends:
+        # Chroma is built on disk so its footprint can be measured like the others'.
+        with tempfile.TemporaryDirectory(prefix="bb-eval-") as tmp:
+            started = time.perf_counter()
+            try:
+                index = configure(build_index(embs, backend, params, directory=tmp), params)
+            except ImportError as e:
+                print(f"Skipping {backend}: {e}")
+                continue
+            build_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            _, I = index.search(queries, k)
+            search_ms = (time.perf_counter() - started) * 1000.0 / len(queries)
+
+            results.append({
+                "backend": backend,
+                "build_s": build_s,
+                "bytes": footprint_bytes(index),
+                "ms_per_query": search_ms,
+                f"recall@{k}": recall_at_k(truth_I, I, k),
+            })
+            del index
+    return results
+
+def synthetic_embeddings(n, dim, seed=0):
+    # Clustered unit vectors, roughly the shape of real sentence embeddings.
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 100), dim)).astype("float32")
+    embs = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(embs)
+    return embs
+
+def perturbed_queries(embs, count, noise=0.3, seed=1):
+    # Held-in vectors plus noise stand in for real questions about those chunks.
+    rng = np.random.default_rng(seed)
+    picks = embs[rng.integers(0, len(embs), count)]
+    queries = (picks + noise * rng.standard_normal(picks.shape) / math.sqrt(embs.shape[1])).astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+def print_report(results, k):
+    print(f"{'backend':<8} {'build s':>8} {'memory MB':>10} {'ms/query':>9} {'recall@' + str(k):>10}")
+    for r in results:
+        mb = f"{r['bytes'] / 1e6:.2f}" if r["bytes"] is not None else "n/a"
+        print(f"{r['backend']:<8} {r['build_s']:>8.2f} {mb:>10} {r['ms_per_query']:>9.3f} {r[f'recall@{k}']:>10.3f}")
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare index backends: memory, latency and recall@k vs flat.")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="evaluate on N synthetic vectors instead of the knowledge base")
+    parser.add_argument("--dim", type=int, default=384, help="dimension for --synthetic")
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--ef-search", type=int)
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        embs = synthetic_embeddings(args.synthetic, args.dim)
+    else:
+        import index_store
+        embs = index_store.load_embeddings()
+    queries = perturbed_queries(embs, args.queries)
+
+    params = {}
+    if args.nprobe is not None:
+        params["nprobe"] = args.nprobe
+    if args.ef_search is not None:
+        params["ef_search"] = args.ef_search
+
+    print(f"{len(embs)} vectors x {embs.shape[1]} dims, {len(queries)} queries")
+    results = evaluate(embs, queries, args.k, args.backends.split(","), params)
+    print_report(results, args.k)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import shutil
+import fcntl
+import hashlib
+import argparse
+import numpy as np
+import index_backends
+import metrics
+
+# ---------------- Config ----------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PDF_PATH = os.path.join(BASE_DIR, "Canadian_Immigration_Knowledge_Base.pdf")
+# A single document or a directory of PDF, text and HTML files.
+KB_PATH = os.environ.get("BB_KB_PATH", PDF_PATH)
+INDEX_DIR = os.environ.get("BB_INDEX_DIR", os.path.join(BASE_DIR, "index_cache"))
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 200
+
+# Bump whenever chunking or the on-disk layout changes, so old stores are not reused.
+FORMAT_VERSION = 5
+
+# Versions kept around after a newer one is published, for workers still reading them.
+KEEP_VERSIONS = 3
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.json"
+IDS_FILE = "ids.npy"
+EMBEDDINGS_FILE = "embeddings.npy"
+META_FILE = "meta.json"
+INDEXES_DIR = "indexes"
+
+# ---------------- Store Layout ----------------
+# INDEX_DIR/<store key>/
+#     CURRENT                 name of the live version
+#     v000007/
+#         manifest.json       per-document content hash and chunk ids
+#         chunks.json         chunk id -> text
+#         ids.npy             chunk ids, row-aligned with embeddings.npy
+#         embeddings.npy      L2-normalised float32 embeddings
+#         indexes/<backend>-<params hash>/   search index over those ids
+#
+# ingest.py writes a new version whenever documents are added, changed or
+# removed, then swaps CURRENT; readers poll CURRENT and reload without a restart.
+
+def store_key(chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, model_name=EMBED_MODEL_NAME):
+    # Chunk ids and embeddings are only comparable under the same chunking
+    # parameters and embedding model.
+    params = {
+        "format": FORMAT_VERSION,
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "model": model_name,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+def store_path(index_dir=INDEX_DIR, **params):
+    return os.path.join(index_dir, store_key(**params))
+
+def index_key(backend, params):
+    # Each backend/parameter combination gets its own index next to the
+    # shared embeddings, so switching backend never re-embeds anything.
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return f"{backend}-{digest}"
+
+def current_version(store=None):
+    try:
+        with open(os.path.join(store or store_path(), CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def version_path(store, version):
+    return os.path.join(store, version)
+
+# ---------------- Publish ----------------
+def _publish(path, write):
+    # Write into a scratch directory and rename it into place, so a reader
+    # never sees a half-written artifact.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        write(tmp_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+def publish_version(store, write):
+    # write(tmp_dir) fills in the new version; CURRENT is switched atomically afterwards.
+    previous = current_version(store)
+    number = int(previous[1:]) + 1 if previous else 1
+    version = f"v{number:06d}"
+    _publish(version_path(store, version), write)
+
+    tmp_current = os.path.join(store, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(tmp_current, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_current, os.path.join(store, CURRENT_FILE))
+    _prune(store, keep=version)
+    return version
+
+def _prune(store, keep):
+    # Readers that still have an old version open keep their mmapped files
+    # (unlinked files stay readable), so only very old versions are removed.
+    versions = sorted(name for name in os.listdir(store) if name.startswith("v") and "." not in name)
+    for name in versions[:-KEEP_VERSIONS]:
+        if name != keep:
+            shutil.rmtree(os.path.join(store, name), ignore_errors=True)
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+# ---------------- Read ----------------
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+def load_docs(path):
+    # Chunk id -> text; JSON keys are strings, FAISS ids are ints.
+    with open(os.path.join(path, CHUNKS_FILE), encoding="utf-8") as f:
+        return {int(k): v for k, v in json.load(f).items()}
+
+def load_vectors(path):
+    # Memory-mapped (ids, embeddings).
+    ids = np.load(os.path.join(path, IDS_FILE), mmap_mode="r")
+    embs = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+    return ids, embs
+
+def load_embeddings(path=None):
+    # Defaults to the live version, syncing the knowledge base first if there is none.
+    if path is None:
+        store = store_path()
+        if current_version(store) is None:
+            import ingest
+            ingest.sync(default_embedder)
+        path = version_path(store, current_version(store))
+    return load_vectors(path)[1]
+
+def default_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBED_MODEL_NAME)
+
+class BuildLock:
+    # Only one process writes a store at a time; the others wait and then reuse its result.
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, ".build.lock")
+
+    def __enter__(self):
+        self.file = open(self.path, "w")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+# ---------------- Indexes ----------------
+def index_path(path, backend, params):
+    return os.path.join(path, INDEXES_DIR, index_key(backend, params))
+
+def build_index_dir(directory, ids, embs, backend, params):
+    index = index_backends.build_index(np.ascontiguousarray(embs), backend, params, directory=directory,
+                                       ids=np.ascontiguousarray(ids))
+    write_index_dir(directory, index, backend, params)
+    return index
+
+def write_index_dir(directory, index, backend, params):
+    os.makedirs(directory, exist_ok=True)
+    index_backends.write_index(index, directory)
+    meta = {
+        "backend": backend,
+        "params": params,
+        "vectors": int(index.ntotal),
+        "bytes": index_backends.stored_bytes(index, directory),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    write_json(os.path.join(directory, META_FILE), meta)
+
+def ensure_index(path, backend=None, params=None):
+    # Returns the directory holding the search index for this backend,
+    # building it from the stored embeddings if needed.
+    backend = backend or index_backends.INDEX_BACKEND
+    params = params or index_backends.build_params()
+    directory = index_path(path, backend, params)
+    if os.path.exists(os.path.join(directory, META_FILE)):
+        return directory
+
+    with BuildLock(os.path.dirname(path)):
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            print(f"Building {backend} index...")
+            ids, embs = load_vectors(path)
+            with metrics.timer("index_build"):
+                _publish(directory, lambda tmp: build_index_dir(tmp, ids, embs, backend, params))
+    return directory
+
+# ---------------- Load ----------------
+def load(path, backend=None):
+    backend = backend or index_backends.INDEX_BACKEND
+    directory = ensure_index(path, backend)
+    started = time.perf_counter()
+    with metrics.timer("index_load"):
+        docs = load_docs(path)
+        index = index_backends.read_index(directory, backend)
+    print(f"Loaded {backend} index {os.path.basename(path)} ({len(docs)} chunks) "
+          f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return docs, index
+
+def load_current(backend=None, store=None):
+    # Returns (docs, index, version) for the live version, or None if nothing is published yet.
+    store = store or store_path()
+    version = current_version(store)
+    if version is None:
+        return None
+    docs, index = load(version_path(store, version), backend)
+    return docs, index, version
+
+def load_or_build(embedder_factory, source=KB_PATH, backend=None, autosync=True):
+    # Brings the store up to date with the knowledge base (a no-op when
+    # nothing changed) and loads the live version.
+    if autosync or current_version() is None:
+        import ingest
+        ingest.sync(embedder_factory, source=source, backend=backend)
+    return load_current(backend)
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the knowledge base index ahead of deploy.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="bring the index up to date with the knowledge base")
+    build_cmd.add_argument("--source", default=KB_PATH, help="a document or a directory of documents")
+    build_cmd.add_argument("--backend", default=index_backends.INDEX_BACKEND, choices=index_backends.BACKENDS)
+    build_cmd.add_argument("--full", action="store_true", help="re-ingest every document from scratch")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        import ingest
+        report = ingest.sync(default_embedder, source=args.source, backend=args.backend, full=args.full)
+        print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
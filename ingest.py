@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import faiss
+import answer_cache
+import index_backends
+import index_store
+import metrics
+from index_store import CHUNK_OVERLAP, CHUNK_SIZE, KB_PATH
+
+# ---------------- Ingestion ----------------
+# Streams every document under the knowledge base path page by page (PDF) or
+# block by block (text, HTML), chunks with overlap, dedupes chunks by content
+# hash, embeds only chunks the store has never seen, and publishes a new store
+# version in which only the added/changed/removed documents' chunks differ.
+
+SUPPORTED_SUFFIXES = (".pdf", ".txt", ".md", ".html", ".htm")
+EMBED_BATCH_SIZE = int(os.environ.get("BB_EMBED_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.environ.get("BB_EMBED_WORKERS", "2"))
+MIN_CHUNK_CHARS = 50
+TEXT_BLOCK_CHARS = 1 << 16
+
+# ---------------- Discover ----------------
+def discover(source=KB_PATH):
+    # Maps a stable document name (path relative to source) to its file path.
+    if os.path.isfile(source):
+        return {os.path.basename(source): source}
+    if not os.path.isdir(source):
+        raise FileNotFoundError(f"❌ Could not find {source}. Upload it to your repo.")
+    found = {}
+    for root, dirs, names in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(names):
+            if name.lower().endswith(SUPPORTED_SUFFIXES):
+                path = os.path.join(root, name)
+                found[os.path.relpath(path, source)] = path
+    return found
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# ---------------- Read ----------------
+def iter_pdf_pages(path):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    for page in reader.pages:
+        text = page.extract_text()
+        if text:
+            yield text + " "
+
+def iter_text_blocks(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for block in iter(lambda: f.read(TEXT_BLOCK_CHARS), ""):
+            yield block
+
+class _HTMLText(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template"}
+
+    # Text between two tags can arrive in several handle_data calls (a read
+    # block may end mid-word), so it is only joined and normalised at the
+    # next tag or at close().
+    def __init__(self):
+        super().__init__()
+        self.pieces = []
+        self._text = []
+        self._skipping = 0
+
+    def _flush(self):
+        text = " ".join("".join(self._text).split())
+        self._text.clear()
+        if text:
+            self.pieces.append(text + " ")
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in self.SKIP:
+            self._skipping += 1
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+def iter_html_text(path):
+    parser = _HTMLText()
+    for block in iter_text_blocks(path):
+        parser.feed(block)
+        yield "".join(parser.pieces)
+        parser.pieces.clear()
+    parser.close()
+    yield "".join(parser.pieces)
+
+def iter_document_text(path):
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".pdf":
+        return iter_pdf_pages(path)
+    if suffix in (".html", ".htm"):
+        return iter_html_text(path)
+    return iter_text_blocks(path)
+
+# ---------------- Chunk ----------------
+def iter_chunks(pieces, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, min_chars=MIN_CHUNK_CHARS):
+    # Fixed-size windows over a stream of text, cut back to the last sentence
+    # end when one is near the window's end. Consecutive windows share
+    # `overlap` characters. Only about one window of text is held at a time.
+    if overlap >= chunk_size:
+        raise ValueError(f"overlap ({overlap}) must be smaller than chunk_size ({chunk_size})")
+    pieces = iter(pieces)
+    buf = ""
+    exhausted = False
+    while True:
+        # Read one overlap past the window so the last window is known in advance.
+        while not exhausted and len(buf) < chunk_size + overlap:
+            piece = next(pieces, None)
+            if piece is None:
+                exhausted = True
+            else:
+                buf += piece
+        if not buf:
+            return
+
+        end = min(chunk_size, len(buf))
+        cut = buf.rfind(". ", 0, end)
+        if cut > max(chunk_size - 300, overlap):
+            end = cut + 1
+        if exhausted and (len(buf) <= chunk_size or len(buf) - end <= overlap):
+            # Last window: take the short tail too, rather than emitting a
+            # final chunk that is mostly overlap with this one.
+            end = len(buf)
+        chunk = buf[:end].strip()
+        if len(chunk) > min_chars:
+            yield chunk
+
+        if end >= len(buf):
+            return
+        buf = buf[end - overlap:]
+
+def chunk_id(text):
+    # Content-addressed: identical chunks share an id (and one embedding)
+    # across documents and versions. 60 bits keeps it a positive int64.
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:15], 16)
+
+# ---------------- Embed ----------------
+def embed_batches(embedder_factory, items):
+    # items: iterable of (chunk_id, text). Yields (ids, embs) per batch. Batches
+    # are encoded on a small thread pool (the model releases the GIL), with at
+    # most 2 * EMBED_WORKERS batches in flight to keep memory bounded.
+    embedder = None
+    pending = []
+
+    def encode(batch):
+        ids = np.array([cid for cid, _ in batch], dtype="int64")
+        with metrics.timer("index_embedding"):
+            embs = embedder.encode([text for _, text in batch], convert_to_numpy=True,
+                                   batch_size=len(batch)).astype("float32")
+            faiss.normalize_L2(embs)
+        return ids, embs
+
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) < EMBED_BATCH_SIZE:
+                continue
+            embedder = embedder or embedder_factory()
+            pending.append(pool.submit(encode, batch))
+            batch = []
+            if len(pending) >= 2 * EMBED_WORKERS:
+                yield pending.pop(0).result()
+        if batch:
+            embedder = embedder or embedder_factory()
+            pending.append(pool.submit(encode, batch))
+        for future in pending:
+            yield future.result()
+
+# ---------------- Sync ----------------
+def sync(embedder_factory, source=KB_PATH, backend=None, full=False, store=None):
+    # Brings the store in line with the documents under `source`. Returns a report.
+    backend = backend or index_backends.INDEX_BACKEND
+    params = index_backends.build_params()
+    store = store or index_store.store_path()
+    started = time.perf_counter()
+
+    with index_store.BuildLock(store):
+        version = index_store.current_version(store)
+        old_path = index_store.version_path(store, version) if version else None
+        old_docs = {} if full or not old_path else index_store.read_manifest(old_path)["docs"]
+
+        files = discover(source)
+        removed = sorted(name for name in old_docs if name not in files)
+        changed, docs_meta = [], {}
+        for name, path in files.items():
+            stat = os.stat(path)
+            entry = old_docs.get(name)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                docs_meta[name] = entry
+                continue
+            digest = file_hash(path)
+            if entry and entry["hash"] == digest:
+                docs_meta[name] = dict(entry, mtime=stat.st_mtime)
+                continue
+            changed.append(name)
+            docs_meta[name] = {"hash": digest, "size": stat.st_size, "mtime": stat.st_mtime, "chunks": []}
+
+        report = {"version": version, "documents": len(files), "added": [], "changed": [],
+                  "removed": removed, "chunks_embedded": 0, "chunks_removed": 0, "index": None}
+        touched_only = any(docs_meta[n] is not old_docs.get(n) for n in docs_meta if n not in changed)
+        if version and not full and not changed and not removed and not touched_only:
+            report["seconds"] = time.perf_counter() - started
+            return report
+
+        old_chunks = index_store.load_docs(old_path) if old_path and not full else {}
+        new_chunks = {}
+
+        def produce():
+            for name in changed:
+                report["changed" if name in old_docs else "added"].append(name)
+                ids, seen = [], set()
+                pieces = metrics.timed_iter(iter_document_text(files[name]), "document_load")
+                for text in metrics.timed_iter(iter_chunks(pieces), "chunking"):
+                    cid = chunk_id(text)
+                    if cid in seen:
+                        continue
+                    seen.add(cid)
+                    ids.append(cid)
+                    if cid not in old_chunks and cid not in new_chunks:
+                        new_chunks[cid] = text
+                        yield cid, text
+                docs_meta[name]["chunks"] = ids
+                print(f"Ingested {name}: {len(ids)} chunks")
+
+        added_ids, added_embs = [], []
+        for ids, embs in embed_batches(embedder_factory, produce()):
+            added_ids.append(ids)
+            added_embs.append(embs)
+
+        # Keep every chunk some document still references; drop the rest.
+        referenced = {cid for entry in docs_meta.values() for cid in entry["chunks"]}
+        if old_path and not full:
+            old_ids, old_embs = index_store.load_vectors(old_path)
+            keep = np.isin(old_ids, np.fromiter(referenced, dtype="int64", count=len(referenced)))
+            dropped = np.asarray(old_ids[~keep])
+            kept_ids, kept_embs = np.asarray(old_ids[keep]), np.asarray(old_embs[keep])
+        else:
+            dropped = np.empty(0, dtype="int64")
+            kept_ids, kept_embs = np.empty(0, dtype="int64"), None
+
+        dim = kept_embs.shape[1] if kept_embs is not None and kept_embs.size else None
+        new_ids = np.concatenate(added_ids) if added_ids else np.empty(0, dtype="int64")
+        new_embs = np.vstack(added_embs) if added_embs else None
+        dim = dim or (new_embs.shape[1] if new_embs is not None else 0)
+        new_embs = new_embs if new_embs is not None else np.empty((0, dim), dtype="float32")
+        kept_embs = kept_embs if kept_embs is not None and kept_embs.size else np.empty((0, dim), dtype="float32")
+        all_ids = np.concatenate([kept_ids, new_ids])
+        if not len(all_ids):
+            raise ValueError(f"No text could be extracted from the documents under {source}")
+        all_embs = np.vstack([kept_embs, new_embs]).astype("float32")
+        chunks = {cid: old_chunks.get(cid) or new_chunks[cid] for cid in all_ids.tolist()}
+
+        report["chunks_embedded"] = int(len(new_ids))
+        report["chunks_removed"] = int(len(dropped))
+
+        def write(tmp):
+            index_store.write_json(os.path.join(tmp, index_store.MANIFEST_FILE), {"docs": docs_meta})
+            index_store.write_json(os.path.join(tmp, index_store.CHUNKS_FILE), {str(k): v for k, v in chunks.items()})
+            np.save(os.path.join(tmp, index_store.IDS_FILE), all_ids)
+            np.save(os.path.join(tmp, index_store.EMBEDDINGS_FILE), all_embs)
+
+            directory = index_store.index_path(tmp, backend, params)
+            old_index = index_store.index_path(old_path, backend, params) if old_path and not full else None
+            with metrics.timer("index_build"):
+                if old_index and os.path.exists(old_index) and backend in index_backends.REMOVABLE:
+                    os.makedirs(directory)
+                    index = index_backends.copy_index(old_index, directory, backend)
+                    index_backends.update_index(index, dropped, new_embs, new_ids)
+                    index_store.write_index_dir(directory, index, backend, params)
+                    report["index"] = f"{backend}: updated in place"
+                else:
+                    index_store.build_index_dir(directory, all_ids, all_embs, backend, params)
+                    report["index"] = f"{backend}: rebuilt"
+
+        report["version"] = index_store.publish_version(store, write)
+        if report["added"] or report["changed"] or report["removed"]:
+            # Cached replies may quote documents that just changed.
+            answer_cache.clear_entries()
+
+    report["seconds"] = time.perf_counter() - started
+    print(f"Knowledge base synced to {report['version']}: +{len(report['added'])} new, "
+          f"~{len(report['changed'])} changed, -{len(removed)} removed documents; "
+          f"{report['chunks_embedded']} chunks embedded, {report['chunks_removed']} dropped")
+    return report
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest new or changed knowledge base documents into the index.")
+    parser.add_argument("--source", default=KB_PATH, help="a document or a directory of documents")
+    parser.add_argument("--backend", default=index_backends.INDEX_BACKEND, choices=index_backends.BACKENDS)
+    parser.add_argument("--full", action="store_true", help="re-ingest every document from scratch")
+    args = parser.parse_args(argv)
+    report = sync(index_store.default_embedder, source=args.source, backend=args.backend, full=args.full)
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
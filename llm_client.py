@@ -0,0 +1,145 @@
+import os
+import random
+import asyncio
+import aiohttp
+import openai
+
+# ---------------- Async LLM Client ----------------
+# One pooled aiohttp session (keep-alive) per event loop, a semaphore that
+# caps in-flight completions, a per-request timeout, and retries with
+# jittered exponential backoff on 429 and 5xx responses.
+
+LLM_CONCURRENCY = int(os.environ.get("BB_LLM_CONCURRENCY", "64"))
+LLM_TIMEOUT = float(os.environ.get("BB_LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.environ.get("BB_LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.environ.get("BB_LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("BB_LLM_BACKOFF_MAX", "8"))
+POOL_SIZE = int(os.environ.get("BB_LLM_POOL_SIZE", str(LLM_CONCURRENCY)))
+
+class LLMError(Exception):
+    # Carries the HTTP status the API should answer with.
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+def _http_status(e):
+    return getattr(e, "http_status", None) or 0
+
+def is_retryable(e):
+    if isinstance(e, (openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+                      openai.error.Timeout, openai.error.APIConnectionError, openai.error.TryAgain)):
+        return True
+    return isinstance(e, openai.error.APIError) and _http_status(e) >= 500
+
+def to_llm_error(e):
+    if isinstance(e, LLMError):
+        return e
+    if isinstance(e, (openai.error.Timeout, asyncio.TimeoutError)):
+        return LLMError("The language model took too long to answer.", status=504)
+    if isinstance(e, openai.error.RateLimitError):
+        return LLMError("Too many requests to the language model, please retry shortly.", status=429)
+    if isinstance(e, openai.error.ServiceUnavailableError):
+        return LLMError("The language model is temporarily unavailable.", status=503)
+    if isinstance(e, openai.error.OpenAIError):
+        # Upstream failures (5xx, connection errors, bad credentials) are a bad gateway for our clients.
+        return LLMError(f"API Error: {e}", status=502)
+    return LLMError(f"API Error: {e}", status=500)
+
+def backoff_delay(attempt, error=None):
+    # Honour Retry-After when the API sends it, otherwise "full jitter" backoff.
+    headers = getattr(error, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+class AsyncLLMClient:
+    def __init__(self, concurrency=LLM_CONCURRENCY, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+                 pool_size=POOL_SIZE):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.stats = {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0}
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+
+    def _bind(self):
+        # The session and semaphore belong to the running event loop.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+            )
+        # openai reads the session from a context variable, which is per task.
+        openai.aiosession.set(self._session)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = self._loop = None
+
+    async def _call(self, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(
+                    openai.ChatCompletion.acreate(request_timeout=self.timeout, **kwargs),
+                    timeout=self.timeout,
+                )
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.stats["errors"] += 1
+                    raise to_llm_error(e) from e
+                self.stats["retries"] += 1
+                await asyncio.sleep(backoff_delay(attempt, e))
+                attempt += 1
+
+    async def complete(self, messages, model):
+        # Returns (reply, usage).
+        self._bind()
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            try:
+                completion = await self._call(model=model, messages=messages)
+            finally:
+                self.stats["in_flight"] -= 1
+        return completion["choices"][0]["message"]["content"], completion.get("usage")
+
+    async def stream(self, messages, model, usage=None):
+        # Yields content deltas; fills the `usage` dict if the API reports it.
+        # Retries only happen before the first delta, since a partially sent
+        # reply cannot be taken back.
+        self._bind()
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            try:
+                chunks = await self._call(model=model, messages=messages, stream=True,
+                                          stream_options={"include_usage": True})
+                iterator = chunks.__aiter__()
+                while True:
+                    # The timeout applies to the gap between deltas, not the whole reply.
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        raise to_llm_error(e) from e
+                    if chunk.get("usage") and usage is not None:
+                        usage.update(chunk["usage"])
+                    if not chunk.get("choices"):
+                        continue
+                    delta = chunk["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+            finally:
+                self.stats["in_flight"] -= 1
@@ -0,0 +1,136 @@
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+
+# ---------------- Stage Timers ----------------
+# Per-process timings of each stage of a request (and of ingestion/warm-up),
+# served in Prometheus text format at /metrics and summarised by bench.py.
+#
+#   with metrics.timer("faiss_search"):
+#       ...
+#
+# Timers nest: a stage's time excludes the stages timed inside it, so the
+# stages of one request add up to its total. Never hold a timer across an
+# `await`; async code reports finished durations with metrics.observe().
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RESERVOIR_SIZE = 2048
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+_lock = threading.Lock()
+_stages = {}
+_local = threading.local()
+
+def observe(stage, seconds):
+    with _lock:
+        hist = _stages.get(stage)
+        if hist is None:
+            hist = _stages[stage] = Histogram()
+        hist.observe(seconds)
+
+class timer:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.children = 0.0
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        observe(self.stage, elapsed - self.children)
+        return False
+
+def timed_iter(iterable, stage):
+    # Times each step of an iterator (e.g. reading the next page of a document).
+    iterator = iter(iterable)
+    while True:
+        with timer(stage):
+            item = next(iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+_DONE = object()
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+def summary():
+    # {stage: {count, total_s, mean_ms, p50_ms, p95_ms, p99_ms}}
+    with _lock:
+        stages = {name: (h.count, h.sum, list(h.recent)) for name, h in _stages.items()}
+    return {
+        name: {
+            "count": count,
+            "total_s": total,
+            "mean_ms": total / count * 1000.0 if count else 0.0,
+            "p50_ms": percentile(recent, 50) * 1000.0,
+            "p95_ms": percentile(recent, 95) * 1000.0,
+            "p99_ms": percentile(recent, 99) * 1000.0,
+        }
+        for name, (count, total, recent) in sorted(stages.items())
+    }
+
+# ---------------- Prometheus ----------------
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _line(name, value, labels=None):
+    label_text = ""
+    if labels:
+        label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+    return f"{name}{label_text} {value}"
+
+def render_prometheus(extra=None):
+    # extra: {metric_name: (type, help, value)} for counters/gauges owned by other modules.
+    lines = [
+        "# HELP bearbot_stage_seconds Time spent in each stage of request handling, ingestion and warm-up.",
+        "# TYPE bearbot_stage_seconds histogram",
+    ]
+    with _lock:
+        stages = {name: (list(h.counts), h.count, h.sum) for name, h in _stages.items()}
+    for name, (counts, count, total) in sorted(stages.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(_line("bearbot_stage_seconds_bucket", cumulative, {"stage": name, "le": bound}))
+        lines.append(_line("bearbot_stage_seconds_bucket", count, {"stage": name, "le": "+Inf"}))
+        lines.append(_line("bearbot_stage_seconds_sum", total, {"stage": name}))
+        lines.append(_line("bearbot_stage_seconds_count", count, {"stage": name}))
+
+    for name, (kind, help_text, value) in sorted((extra or {}).items()):
+        if value is None:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(_line(name, value))
+    return "\n".join(lines) + "\n"
@@ -6,3 +6,8 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 # Import the app object from app.py and name it 'application'
 from app import app as application
+
+# Start loading the model and index in the background; "/" answers right away
+# and "/ready" reports 503 until loading has finished.
+import resources
+resources.warm_up_async()
@@ -0,0 +1,148 @@
+import os
+import re
+import threading
+import metrics
+
+# ---------------- Prompt Assembly ----------------
+# Keeps the per-request prompt small:
+#   * the system prompt is compacted once at import (table padding and
+#     duplicated "[url](url)" links removed) and sent byte-identical on every
+#     request as the first message, so the provider's prompt cache can reuse it;
+#   * retrieved chunks go in a separate message after it, deduplicated and
+#     trimmed to a token budget in rank order, so low-ranked chunks are the
+#     ones dropped or truncated.
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("BB_CONTEXT_TOKENS", "700"))
+# A truncated chunk shorter than this is dropped rather than sent.
+MIN_CHUNK_TOKENS = 40
+# Chunks sharing more than this fraction of word shingles with a higher-ranked one are dropped.
+DUPLICATE_OVERLAP = 0.6
+
+# ---------------- Tokens ----------------
+class _ApproxEncoding:
+    # Stand-in when tiktoken's encoding files cannot be loaded (no network on
+    # first use): about 4 characters per token, close enough for budgeting.
+    name = "approx-4-chars"
+
+    def encode(self, text):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def get_encoding(model=None):
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    try:
+                        _encoding = tiktoken.encoding_for_model(model or "")
+                    except KeyError:
+                        _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    print(f"⚠️ tiktoken unavailable ({type(e).__name__}); estimating tokens from length")
+                    _encoding = _ApproxEncoding()
+    return _encoding
+
+def count_tokens(text, model=None):
+    return len(get_encoding(model).encode(text))
+
+def truncate_tokens(text, max_tokens, model=None):
+    enc = get_encoding(model)
+    tokens = enc.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+# ---------------- Static Prefix ----------------
+_LINK = re.compile(r"\[([^\]]+)\]\(([^)\s]+)\)")
+
+def _collapse_link(match):
+    # "[x](x)" and "[x](mailto:x)" become "x"; links with real text are kept.
+    text, url = match.group(1).strip(), match.group(2)
+    return text if text == url or "mailto:" + text == url else match.group(0)
+
+def compact_prompt(prompt):
+    # Same content, fewer tokens: markdown table cells lose their alignment
+    # padding, separator rows shrink to "|---|", "[url](url)" becomes "url",
+    # and blank-line runs and trailing spaces go.
+    lines = []
+    for line in prompt.strip().splitlines():
+        line = _LINK.sub(_collapse_link, line).rstrip()
+        if line.lstrip().startswith("|"):
+            cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
+            if all(re.fullmatch(r":?-+:?", cell) for cell in cells if cell):
+                cells = ["---"] * len(cells)
+            line = "| " + " | ".join(cells) + " |"
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines)
+
+# ---------------- Context ----------------
+def _shingles(text, size=5):
+    words = text.lower().split()
+    return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def select_context(chunks, budget=CONTEXT_TOKEN_BUDGET, model=None):
+    # chunks are in rank order. Returns the chunks to send, whitespace-normalised,
+    # deduplicated and fitted into `budget` tokens.
+    selected, seen, used = [], [], 0
+    for chunk in chunks:
+        text = " ".join(chunk.split())
+        shingles = _shingles(text)
+        if any(len(shingles & other) > DUPLICATE_OVERLAP * min(len(shingles), len(other)) for other in seen):
+            continue
+        remaining = budget - used
+        tokens = count_tokens(text, model)
+        if tokens > remaining:
+            if remaining < MIN_CHUNK_TOKENS:
+                break
+            text = truncate_tokens(text, remaining, model)
+            tokens = remaining
+        selected.append(text)
+        seen.append(shingles)
+        used += tokens
+    return selected
+
+def build_messages(static_prefix, user_query, chunks, model=None):
+    # static_prefix must be the same string object/content for every request.
+    with metrics.timer("prompt_build"):
+        context = "\n\n".join(select_context(chunks, model=model))
+    return [
+        {"role": "system", "content": static_prefix},
+        {"role": "system", "content": "Context:\n" + context},
+        {"role": "user", "content": user_query},
+    ]
+
+# ---------------- Usage ----------------
+usage_totals = {"requests": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+_usage_lock = threading.Lock()
+
+def record_usage(usage, messages=None, reply=None, model=None, seconds=None):
+    # Logs one line per LLM call. Falls back to local counts when the API
+    # did not return usage (e.g. a stream without the final usage chunk).
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    estimated = prompt_tokens is None
+    if prompt_tokens is None and messages is not None:
+        prompt_tokens = sum(count_tokens(m["content"], model) for m in messages)
+    if completion_tokens is None and reply is not None:
+        completion_tokens = count_tokens(reply, model)
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    prompt_tokens, completion_tokens = prompt_tokens or 0, completion_tokens or 0
+
+    with _usage_lock:
+        usage_totals["requests"] += 1
+        usage_totals["prompt_tokens"] += prompt_tokens
+        usage_totals["cached_prompt_tokens"] += cached
+        usage_totals["completion_tokens"] += completion_tokens
+
+    took = f" llm_s={seconds:.2f}" if seconds is not None else ""
+    print(f"tokens prompt={prompt_tokens} cached={cached} completion={completion_tokens}"
+          f"{' (estimated)' if estimated else ''}{took}")
@@ -0,0 +1,173 @@
+import os
+import time
+import threading
+import index_store
+import metrics
+from index_store import EMBED_MODEL_NAME, load_or_build
+
+# ---------------- Lazy Resources ----------------
+# The embedding model and the knowledge base index are loaded on first use
+# (or ahead of time by warm_up(), e.g. from the gunicorn preload hook) rather
+# than as import side effects, so importing app.py is cheap and the health
+# check answers immediately.
+#
+# When warm_up() runs in the gunicorn master before workers are forked, the
+# model weights are shared copy-on-write and the index file is memory-mapped,
+# so every worker reads the same physical pages instead of holding its own copy.
+#
+# Workers notice a newly published knowledge base version (see ingest.py)
+# within STORE_POLL_INTERVAL seconds and swap it in without restarting.
+
+COLD, WARMING, READY, FAILED = "cold", "warming", "ready", "failed"
+
+STORE_POLL_INTERVAL = float(os.environ.get("BB_STORE_POLL_INTERVAL", "5"))
+
+_lock = threading.RLock()
+_embedder = None
+_store = None
+_store_version = None
+_last_poll = 0.0
+_answer_cache = None
+_reload = {"status": "idle", "report": None, "error": None}
+_status = COLD
+_error = None
+_loaded_in = None
+
+def _load_embedder():
+    from sentence_transformers import SentenceTransformer
+    with metrics.timer("model_load"):
+        return SentenceTransformer(EMBED_MODEL_NAME)
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                _embedder = _load_embedder()
+    return _embedder
+
+def get_store():
+    # Returns (docs, index); docs maps the index's chunk ids to chunk text.
+    global _store, _store_version, _last_poll
+    if _store is None:
+        with _lock:
+            if _store is None:
+                docs, index, _store_version = load_or_build(get_embedder)
+                _store = (docs, index)
+                _last_poll = time.monotonic()
+    elif time.monotonic() - _last_poll > STORE_POLL_INTERVAL:
+        _last_poll = time.monotonic()
+        if index_store.current_version() != _store_version:
+            refresh_store()
+    return _store
+
+def refresh_store():
+    # Swap in the live version; requests already holding the old tuple finish on it.
+    global _store, _store_version
+    with _lock:
+        loaded = index_store.load_current()
+        if loaded is not None and loaded[2] != _store_version:
+            docs, index, _store_version = loaded
+            _store = (docs, index)
+            print(f"Switched to knowledge base {_store_version} (pid {os.getpid()})")
+
+def reload_knowledge_base(full=False):
+    # Ingests new/changed/removed documents and publishes a new version.
+    import ingest
+    report = ingest.sync(get_embedder, full=full)  # also clears the answer cache on changes
+    refresh_store()
+    return report
+
+def reload_async(full=False):
+    # Runs reload_knowledge_base() in the background; returns False if one is already running.
+    with _lock:
+        if _reload["status"] == "running":
+            return False
+        _reload.update(status="running", error=None)
+    threading.Thread(target=_reload_quietly, args=(full,), name="bb-reload", daemon=True).start()
+    return True
+
+def _reload_quietly(full):
+    try:
+        report = reload_knowledge_base(full)
+    except Exception as e:
+        print(f"❌ Knowledge base reload failed: {e}")
+        _reload.update(status="failed", error=str(e))
+        return
+    _reload.update(status="done", report=report)
+
+def reload_status():
+    return dict(_reload, version=_store_version)
+
+def get_answer_cache():
+    global _answer_cache
+    if _answer_cache is None:
+        with _lock:
+            if _answer_cache is None:
+                from answer_cache import SemanticCache
+                dim = get_embedder().get_sentence_embedding_dimension()
+                _answer_cache = SemanticCache(dim)
+    return _answer_cache
+
+def peek_answer_cache():
+    # The answer cache if it exists, else None; never loads the model (for stats/metrics).
+    return _answer_cache
+
+def warm_up():
+    global _status
+    with _lock:
+        if _status == READY:
+            return
+        _status = WARMING
+    _load()
+
+def warm_up_async():
+    # Starts warming in a background thread; safe to call repeatedly.
+    global _status
+    with _lock:
+        if _status in (WARMING, READY):
+            return
+        _status = WARMING
+    threading.Thread(target=_load_quietly, name="bb-warm-up", daemon=True).start()
+
+def _load():
+    global _status, _error, _loaded_in
+    started = time.perf_counter()
+    try:
+        get_embedder()
+        get_store()
+    except Exception as e:
+        with _lock:
+            _status, _error = FAILED, str(e)
+        raise
+    with _lock:
+        _status, _error = READY, None
+        _loaded_in = time.perf_counter() - started
+    print(f"Resources ready in {_loaded_in:.2f}s (pid {os.getpid()})")
+
+def _load_quietly():
+    try:
+        _load()
+    except Exception as e:
+        print(f"❌ Warm-up failed: {e}")
+
+def is_ready():
+    # Resources may also have been loaded lazily by a request, not by warm_up().
+    return _status == READY or (_embedder is not None and _store is not None)
+
+def status():
+    current = READY if is_ready() else _status
+    return {"status": current, "error": _error, "loaded_in_s": _loaded_in, "pid": os.getpid()}
+
+def _after_fork_in_child():
+    # A warm-up thread started in the parent does not survive fork; reset the
+    # lock and let the child start its own warm-up on demand.
+    global _lock, _status
+    _lock = threading.RLock()
+    if _status == WARMING:
+        _status = COLD
+    if _reload["status"] == "running":
+        _reload["status"] = "idle"
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,66 @@
+import time
+import numpy as np
+import faiss
+import pytest
+import answer_cache
+from answer_cache import SemanticCache
+
+DIM = 16
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(answer_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(answer_cache, "SYNC_INTERVAL", 0.0)
+
+def emb(seed, noise=0.0, base=None):
+    rng = np.random.RandomState(seed)
+    v = (base if base is not None else rng.randn(1, DIM)).astype("float32").copy()
+    v += noise * rng.randn(1, DIM).astype("float32")
+    faiss.normalize_L2(v)
+    return v
+
+def test_hit_above_threshold_and_miss_below(tmp_path):
+    cache = SemanticCache(DIM, str(tmp_path / "c.db"), threshold=0.95)
+    q = emb(1)
+    cache.put(q, "How do I study in Canada?", "Start here.")
+    assert cache.lookup(emb(2, noise=0.01, base=q)) == "Start here."
+    assert cache.lookup(emb(3)) is None
+    stats = cache.summary()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+def test_expired_entries_are_not_served(tmp_path):
+    cache = SemanticCache(DIM, str(tmp_path / "c.db"), ttl=0.05)
+    q = emb(1)
+    cache.put(q, "q", "old")
+    time.sleep(0.1)
+    assert cache.lookup(q) is None
+    assert cache.summary()["expirations"] == 1
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = SemanticCache(DIM, str(tmp_path / "c.db"), max_entries=2)
+    a, b, c = emb(1), emb(2), emb(3)
+    cache.put(a, "a", "A")
+    cache.put(b, "b", "B")
+    assert cache.lookup(a) == "A"  # b is now the least recently used
+    cache.put(c, "c", "C")
+    assert cache.lookup(b) is None
+    assert cache.lookup(a) == "A" and cache.lookup(c) == "C"
+    assert cache.summary()["evictions"] == 1
+
+def test_workers_see_each_others_entries_and_deletions(tmp_path):
+    path = str(tmp_path / "c.db")
+    worker_a, worker_b = SemanticCache(DIM, path), SemanticCache(DIM, path)
+    q = emb(1)
+    assert worker_b.lookup(q) is None
+    worker_a.put(q, "q", "shared")
+    assert worker_b.lookup(q) == "shared"
+    answer_cache.clear_entries(path)
+    assert worker_a.lookup(q) is None and worker_b.lookup(q) is None
+    worker_b.put(q, "q", "fresh")
+    assert worker_a.lookup(q) == "fresh"
+
+def test_disabled_cache_never_stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache, "CACHE_ENABLED", False)
+    cache = SemanticCache(DIM, str(tmp_path / "c.db"))
+    cache.put(emb(1), "q", "r")
+    assert cache.lookup(emb(1)) is None
@@ -0,0 +1,40 @@
+import pytest
+import app
+
+@pytest.mark.parametrize("value", [0, -1, app.BULK_MAX_K + 1, 2.9, 3.0, True, "3", "07", None, [3]])
+def test_parse_k_rejects_anything_but_an_integer_in_range(value):
+    assert app.parse_k(value) is None
+
+@pytest.mark.parametrize("value", [1, 3, app.BULK_MAX_K])
+def test_parse_k_accepts_integers_in_range(value):
+    assert app.parse_k(value) == value
+
+@pytest.mark.parametrize("k", [0, -1, "x", 2.9, True, 100000])
+def test_retrieve_rejects_bad_k_with_400(k):
+    response = app.app.test_client().post("/retrieve", json={"queries": ["study permit"], "k": k})
+    assert response.status_code == 400
+    assert "'k'" in response.get_json()["error"]
+
+class RecordingCache:
+    def __init__(self):
+        self.puts = []
+
+    def lookup(self, q_emb):
+        return None
+
+    def put(self, q_emb, query, reply):
+        self.puts.append(reply)
+
+    def record_llm_call(self, seconds):
+        pass
+
+@pytest.mark.parametrize("deltas", [[], ["Hello", " there"]])
+def test_chat_stream_caches_only_non_empty_replies(monkeypatch, deltas):
+    cache = RecordingCache()
+    monkeypatch.setattr(app, "embed_and_retrieve", lambda query, k=app.RETRIEVE_K: (None, ["chunk"]))
+    monkeypatch.setattr(app.resources, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(app, "record_usage", lambda *args, **kwargs: None)
+    chunks = [{"choices": [{"delta": {"content": d}}]} for d in deltas] + [{"choices": [], "usage": {}}]
+    monkeypatch.setattr(app.openai.ChatCompletion, "create", lambda **kwargs: iter(chunks))
+    assert "".join(app.chat_stream("hi")) == "".join(deltas)
+    assert cache.puts == (["Hello there"] if deltas else [])
@@ -0,0 +1,78 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from batcher import MicroBatcher
+
+def test_concurrent_items_share_a_batch_and_get_their_own_results():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=64, max_wait_ms=50)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(batcher, range(16)))
+    assert results == [n * 2 for n in range(16)]
+    assert len(calls) < 16
+    assert sorted(n for call in calls for n in call) == list(range(16))
+    assert batcher.summary()["items"] == 16
+
+def test_batches_are_capped_at_max_batch_size():
+    sizes = []
+    batcher = MicroBatcher(lambda items: sizes.append(len(items)) or items, max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit(n) for n in range(10)]
+    assert [f.result(timeout=5) for f in futures] == list(range(10))
+    assert max(sizes) <= 4
+
+def test_exception_reaches_every_caller_in_the_batch():
+    def boom(items):
+        raise RuntimeError("index unavailable")
+
+    batcher = MicroBatcher(boom, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(n) for n in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="index unavailable"):
+            future.result(timeout=5)
+    # The worker survives and keeps serving.
+    batcher.fn = lambda items: items
+    assert batcher(7) == 7
+
+def test_submit_never_runs_on_the_callers_thread():
+    # Even with batching off, so an event loop awaiting submit() is never blocked.
+    threads = []
+    batcher = MicroBatcher(lambda items: threads.append(threading.get_ident()) or items, max_batch_size=1)
+
+    async def main():
+        return await asyncio.wrap_future(batcher.submit("q"))
+
+    assert asyncio.run(main()) == "q"
+    assert threads and threads[0] != threading.get_ident()
+
+def test_direct_call_runs_inline_when_batching_is_off():
+    threads = []
+    batcher = MicroBatcher(lambda items: threads.append(threading.get_ident()) or items, max_batch_size=1)
+    assert batcher("q") == "q"
+    assert threads == [threading.get_ident()]
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_starts_its_own_worker():
+    batcher = MicroBatcher(lambda items: [item + 1 for item in items], max_batch_size=8, max_wait_ms=1)
+    assert batcher(1) == 2  # worker started in the parent
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write_fd, str(batcher.submit(41).result(timeout=5)).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    deadline = time.monotonic() + 10
+    data = b""
+    while time.monotonic() < deadline and not data:
+        data = os.read(read_fd, 16)
+    os.waitpid(pid, 0)
+    assert data == b"42"
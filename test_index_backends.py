@@ -0,0 +1,65 @@
+import numpy as np
+import faiss
+import pytest
+import index_backends
+from index_backends import REMOVABLE, build_index, configure, copy_index, read_index, update_index, write_index
+
+def vectors(n, dim=32, seed=0):
+    rng = np.random.RandomState(seed)
+    embs = rng.randn(n, dim).astype("float32")
+    faiss.normalize_L2(embs)
+    ids = rng.permutation(np.arange(1, 4 * n, dtype="int64") * 7919)[:n]
+    return embs, ids
+
+def updated_index(backend, tmp_path, embs, ids, remove, add):
+    # The ingest path: build and write, copy into a new version, update, write, reload.
+    if backend == "chroma":
+        pytest.importorskip("chromadb")
+    old, new = tmp_path / "old", tmp_path / "new"
+    old.mkdir()
+    new.mkdir()
+    write_index(build_index(embs[:-add], backend, directory=str(old), ids=ids[:-add]), str(old))
+    index = copy_index(str(old), str(new), backend)
+    update_index(index, ids[:remove], embs[-add:], ids[-add:])
+    write_index(index, str(new))
+    return configure(read_index(str(new), backend), {"nprobe": 1 << 16, "ef_search": 256})
+
+@pytest.mark.parametrize("backend", REMOVABLE)
+def test_remove_then_search(backend, tmp_path):
+    embs, ids = vectors(2000)
+    index = updated_index(backend, tmp_path, embs, ids, remove=400, add=1)
+    assert index.ntotal == 2000 - 400
+    _, I = index.search(embs[:400], 10)
+    assert not np.isin(I, ids[:400]).any()
+    kept_embs, kept_ids = embs[400:], ids[400:]
+    _, I = index.search(kept_embs, 5)
+    assert np.isin(I[I >= 0], kept_ids).all()
+    assert (I[:, 0] == kept_ids).mean() > 0.95
+
+@pytest.mark.parametrize("backend", REMOVABLE)
+def test_add_then_search(backend, tmp_path):
+    embs, ids = vectors(2000, seed=1)
+    index = updated_index(backend, tmp_path, embs, ids, remove=100, add=300)
+    assert index.ntotal == 2000 - 100
+    _, I = index.search(embs[-300:], 5)
+    assert (I[:, 0] == ids[-300:]).mean() > 0.95
+
+def test_ivf_keeps_ids_without_id_map():
+    embs, ids = vectors(2000)
+    for backend in ("ivf", "ivfpq"):
+        index = build_index(embs, backend, ids=ids)
+        assert not isinstance(index, faiss.IndexIDMap)
+    assert isinstance(build_index(embs, "flat", ids=ids), faiss.IndexIDMap)
+
+def test_evaluate_reports_a_footprint_for_every_backend():
+    pytest.importorskip("chromadb")
+    embs, _ = vectors(1000)
+    results = index_backends.evaluate(embs, embs[:20], k=5)
+    assert {r["backend"] for r in results} == set(index_backends.BACKENDS)
+    assert all(r["bytes"] and r["bytes"] > 0 for r in results)
+
+def test_stored_bytes_is_the_written_file_size(tmp_path):
+    embs, ids = vectors(500)
+    index = build_index(embs, "flat", ids=ids)
+    write_index(index, str(tmp_path))
+    assert index_backends.stored_bytes(index, str(tmp_path)) == (tmp_path / "index.faiss").stat().st_size
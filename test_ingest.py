@@ -0,0 +1,52 @@
+import string
+import random
+import pytest
+import ingest
+from ingest import iter_chunks
+
+def sentences(n):
+    return " ".join(f"Sentence number {i} talks about immigration pathway {i % 7}." for i in range(n))
+
+def test_consecutive_chunks_share_overlap():
+    text = "".join(random.Random(0).choice(string.ascii_letters) for _ in range(5000))
+    chunks = list(iter_chunks([text], 300, 100))
+    assert len(chunks) == 25
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert prev[-100:] == nxt[:100]
+    assert chunks[0].startswith(text[:300])
+    assert chunks[-1].endswith(text[-50:])
+
+def test_tail_is_not_duplicated():
+    text = sentences(200)
+    chunks = list(iter_chunks([text], 300, 100))
+    # No chunk is contained in its predecessor (the old tail emitted shrinking suffixes).
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt not in prev
+    assert chunks[-1].endswith(text[-40:])
+    assert len(chunks) < len(text) / 150
+
+def test_every_sentence_is_kept():
+    text = sentences(120)
+    chunks = list(iter_chunks(iter(text[i:i + 97] for i in range(0, len(text), 97)), 400, 80))
+    joined = "\n".join(chunks)
+    for i in range(120):
+        assert f"Sentence number {i} " in joined
+
+def test_default_sizes_end_without_overlap_only_chunk():
+    text = sentences(300)
+    chunks = list(iter_chunks([text]))
+    last_new = chunks[-1][200:]
+    assert len(last_new) > 200
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        list(iter_chunks(["x" * 1000], 100, 100))
+
+def test_html_words_are_not_split_at_read_block_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "TEXT_BLOCK_CHARS", 7)
+    path = tmp_path / "page.html"
+    path.write_text("<html><head><style>p { color: red }</style></head>"
+                    "<body><p>Immigration   pathways\nfor students</p><script>var x = 1;</script>"
+                    "<p>Contact us today</p></body></html>", encoding="utf-8")
+    text = "".join(ingest.iter_html_text(str(path)))
+    assert text.split() == ["Immigration", "pathways", "for", "students", "Contact", "us", "today"]
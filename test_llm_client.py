@@ -0,0 +1,113 @@
+import asyncio
+import openai
+import pytest
+import llm_client
+from llm_client import AsyncLLMClient, LLMError, backoff_delay, is_retryable, to_llm_error
+
+REPLY = {"choices": [{"message": {"content": "Hello"}}], "usage": {"prompt_tokens": 3, "completion_tokens": 1}}
+
+def scripted(monkeypatch, *outcomes):
+    # acreate raises or returns the given outcomes in order; returns the call log.
+    calls = []
+
+    async def acreate(**kwargs):
+        calls.append(kwargs)
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if callable(outcome):
+            return await outcome()
+        return outcome
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt, error=None: 0)
+    return calls
+
+def run(client, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+def api_error(status):
+    return openai.error.APIError("upstream failed", http_status=status)
+
+def test_retries_rate_limits_and_5xx_then_succeeds(monkeypatch):
+    calls = scripted(monkeypatch, openai.error.RateLimitError("slow down"), api_error(502), REPLY)
+    client = AsyncLLMClient(max_retries=3)
+    assert run(client, client.complete([{"role": "user", "content": "hi"}], "m")) == ("Hello", REPLY["usage"])
+    assert len(calls) == 3
+    assert client.stats["retries"] == 2 and client.stats["in_flight"] == 0
+
+def test_gives_up_after_max_retries_with_the_mapped_status(monkeypatch):
+    calls = scripted(monkeypatch, openai.error.RateLimitError("slow down"))
+    client = AsyncLLMClient(max_retries=2)
+    with pytest.raises(LLMError) as raised:
+        run(client, client.complete([], "m"))
+    assert raised.value.status == 429
+    assert len(calls) == 3 and client.stats["errors"] == 1
+
+def test_client_errors_are_not_retried(monkeypatch):
+    calls = scripted(monkeypatch, openai.error.InvalidRequestError("bad request", None))
+    client = AsyncLLMClient(max_retries=3)
+    with pytest.raises(LLMError) as raised:
+        run(client, client.complete([], "m"))
+    assert raised.value.status == 502 and len(calls) == 1
+
+def test_slow_calls_time_out_as_504(monkeypatch):
+    async def slow():
+        await asyncio.sleep(1)
+        return REPLY
+
+    scripted(monkeypatch, slow)
+    client = AsyncLLMClient(timeout=0.05, max_retries=0)
+    with pytest.raises(LLMError) as raised:
+        run(client, client.complete([], "m"))
+    assert raised.value.status == 504
+
+def test_stream_yields_deltas_and_fills_usage(monkeypatch):
+    async def chunks():
+        async def gen():
+            for piece in ("Hel", "lo"):
+                yield {"choices": [{"delta": {"content": piece}}]}
+            yield {"choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2}}
+        return gen()
+
+    calls = scripted(monkeypatch, openai.error.ServiceUnavailableError("busy"), chunks)
+    client = AsyncLLMClient(max_retries=1)
+    usage = {}
+
+    async def collect():
+        return [delta async for delta in client.stream([], "m", usage)]
+
+    assert run(client, collect()) == ["Hel", "lo"]
+    assert usage == {"prompt_tokens": 3, "completion_tokens": 2}
+    assert calls[-1]["stream"] is True and calls[-1]["stream_options"] == {"include_usage": True}
+
+@pytest.mark.parametrize("error, status", [
+    (openai.error.Timeout("slow"), 504),
+    (asyncio.TimeoutError(), 504),
+    (openai.error.RateLimitError("slow down"), 429),
+    (openai.error.ServiceUnavailableError("busy"), 503),
+    (api_error(500), 502),
+    (openai.error.AuthenticationError("bad key"), 502),
+    (ValueError("bug"), 500),
+])
+def test_errors_map_to_status_codes(error, status):
+    assert to_llm_error(error).status == status
+
+def test_only_transient_errors_are_retryable():
+    assert is_retryable(openai.error.RateLimitError("slow down"))
+    assert is_retryable(api_error(503))
+    assert not is_retryable(api_error(400))
+    assert not is_retryable(openai.error.AuthenticationError("bad key"))
+
+def test_backoff_honours_retry_after_and_caps_jitter():
+    error = openai.error.RateLimitError("slow down", headers={"retry-after": "2"})
+    assert backoff_delay(0, error) == 2.0
+    error = openai.error.RateLimitError("slow down", headers={"retry-after": "3600"})
+    assert backoff_delay(0, error) == llm_client.LLM_BACKOFF_MAX
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt) <= llm_client.LLM_BACKOFF_MAX
@@ -0,0 +1,54 @@
+import pytest
+import prompt
+from prompt import build_messages, compact_prompt, count_tokens, select_context
+
+@pytest.fixture(autouse=True)
+def approx_tokens(monkeypatch):
+    # Deterministic, offline token counts: 4 characters per token.
+    monkeypatch.setattr(prompt, "_encoding", prompt._ApproxEncoding())
+
+def test_compact_prompt_strips_table_padding_and_separator_rows():
+    table = ("| Intent        | Keywords          |\n"
+             "| ------------- | :---------------: |\n"
+             "| Study         | study, college    |   \n\n\n\nNext")
+    assert compact_prompt(table) == "| Intent | Keywords |\n| --- | --- |\n| Study | study, college |\n\nNext"
+
+def test_compact_prompt_collapses_self_links_to_their_text():
+    text = ("* Contact Us: [https://example.com/contact/](https://example.com/contact/)\n"
+            "* Email: [contact@example.com](mailto:contact@example.com)\n"
+            "* Visit [our site](https://example.com/)")
+    assert compact_prompt(text).splitlines() == [
+        "* Contact Us: https://example.com/contact/",
+        "* Email: contact@example.com",
+        "* Visit [our site](https://example.com/)",
+    ]
+
+def test_app_call_to_action_reads_cleanly():
+    import app
+    assert "* Email: contact@canadaforimmigration.com" in app.STATIC_SYSTEM_PROMPT
+    assert "mailto:" not in app.STATIC_SYSTEM_PROMPT
+
+def test_select_context_drops_near_duplicates_in_rank_order():
+    first = ("Express Entry is the main pathway for skilled workers who want permanent residence in Canada. "
+             "Candidates create a profile, receive a CRS score based on age, education, language ability and "
+             "work experience, and the highest ranked profiles are invited to apply in regular draws.")
+    near_copy = first.replace("main", "primary")
+    other = "Study permits let international students attend designated learning institutions in Canada."
+    assert select_context([first, near_copy, other], budget=1000) == [first, other]
+
+def test_select_context_fits_the_budget_and_truncates_the_last_chunk():
+    chunks = ["a" * 400, "b" * 400, "c" * 400]  # 100 tokens each
+    selected = select_context(chunks, budget=250)
+    assert selected == ["a" * 400, "b" * 400, "c" * 200]
+    assert sum(count_tokens(c) for c in selected) == 250
+
+def test_select_context_skips_a_truncated_chunk_below_the_minimum():
+    budget = 100 + prompt.MIN_CHUNK_TOKENS - 1
+    assert select_context(["a" * 400, "b" * 400], budget=budget) == ["a" * 400]
+
+def test_build_messages_keeps_the_static_prefix_first_and_unchanged():
+    static = compact_prompt("You are a helpful assistant.")
+    messages = build_messages(static, "How do I apply?", ["Some   context\nhere."])
+    assert messages[0] == {"role": "system", "content": static}
+    assert messages[1] == {"role": "system", "content": "Context:\nSome context here."}
+    assert messages[2] == {"role": "user", "content": "How do I apply?"}